@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from backend import workbook_store
+from backend.workbook_store import get_usage_history_counter
+
+_MAX_ENTRIES = 256
+# Storing an entry waits this long at most for a user write to finish.
+_BUSY_TIMEOUT_SEC = 0.05
+_WRITE_LOCK = threading.Lock()
+_WRITE_CONNECTION = {"key": None, "conn": None}
+
+
+def cache_key(*parts):
+    return json.dumps(parts, separators=(",", ":"))
+
+
+def get(conn, key):
+    """
+    The payload stored for key, or None when it is missing or was computed
+    before usage history last changed.
+    """
+    row = conn.execute(
+        "SELECT history_counter, payload FROM analytics_cache WHERE cache_key = ?",
+        (key,),
+    ).fetchone()
+    if row is None or row["history_counter"] != get_usage_history_counter(conn):
+        return None
+    try:
+        return json.loads(row["payload"])
+    except ValueError:
+        return None
+
+
+def _cache_connection():
+    # Caller holds _WRITE_LOCK. A connection of its own, outside the pool and
+    # the writer thread, so storing an entry never runs the write path's
+    # backup hook or queues behind user writes.
+    path = os.path.abspath(workbook_store.DATABASE_PATH)
+    key = (path, os.getpid())
+    if _WRITE_CONNECTION["key"] != key:
+        if _WRITE_CONNECTION["conn"] is not None and _WRITE_CONNECTION["key"][1] == key[1]:
+            _WRITE_CONNECTION["conn"].close()
+        conn = sqlite3.connect(path, timeout=_BUSY_TIMEOUT_SEC, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous = NORMAL")
+        _WRITE_CONNECTION["key"] = key
+        _WRITE_CONNECTION["conn"] = conn
+    return _WRITE_CONNECTION["conn"]
+
+
+def _store(conn, key, payload_text, counter):
+    # Usage history changed while the payload was being computed, so it may
+    # already be out of date.
+    if get_usage_history_counter(conn) != counter:
+        return False
+    # Entries from an older history can never be served again.
+    conn.execute("DELETE FROM analytics_cache WHERE history_counter != ?", (counter,))
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO analytics_cache (cache_key, history_counter, created_at, payload)
+        VALUES (?, ?, ?, ?)
+        """,
+        (key, counter, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), payload_text),
+    )
+    conn.execute(
+        """
+        DELETE FROM analytics_cache
+        WHERE cache_key NOT IN (
+            SELECT cache_key FROM analytics_cache
+            ORDER BY created_at DESC, rowid DESC
+            LIMIT ?
+        )
+        """,
+        (_MAX_ENTRIES,),
+    )
+    return True
+
+
+def put(key, payload, counter):
+    """
+    Store a JSON-serializable payload for key. counter is the usage history
+    counter read before the payload was computed; the entry is dropped if
+    history has changed since. The entry is also skipped when a user write
+    holds the database, since it is only recomputed on the next read.
+    """
+    payload_text = json.dumps(payload, separators=(",", ":"))
+    with _WRITE_LOCK:
+        try:
+            conn = _cache_connection()
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error:
+            return False
+        try:
+            stored = _store(conn, key, payload_text, counter)
+            conn.execute("COMMIT")
+            return stored
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return False
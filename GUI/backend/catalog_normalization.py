@@ -1,11 +1,8 @@
-import json
-import os
 import re
 
-from backend.config import DATA_DIR
-
-CATALOG_ALIASES_PATH = os.path.join(DATA_DIR, "catalog_aliases.json")
 _VALID_MAPPING_NAMES = ("brand", "color", "material", "attribute")
+_SEPARATOR_PATTERN = re.compile(r"[-_/+,]+")
+_PUNCTUATION_PATTERN = re.compile(r"[()'`.]")
 
 
 def normalize_space(value):
@@ -39,11 +36,12 @@ def iter_lookup_keys(value):
     expanded_texts = []
     seen_texts = set()
     for text in ordered_texts:
+        separated = _SEPARATOR_PATTERN.sub(" ", text)
         for candidate in (
             text,
-            re.sub(r"[-_/+,]+", " ", text),
-            re.sub(r"[()'`.]", "", text),
-            re.sub(r"[()'`.]", "", re.sub(r"[-_/+,]+", " ", text)),
+            separated,
+            _PUNCTUATION_PATTERN.sub("", text),
+            _PUNCTUATION_PATTERN.sub("", separated),
         ):
             normalized_candidate = normalize_space(candidate)
             if not normalized_candidate:
@@ -75,13 +73,14 @@ def _empty_alias_config():
 
 
 def load_alias_config():
-    config = _empty_alias_config()
-    try:
-        with open(CATALOG_ALIASES_PATH, "r", encoding="utf-8") as handle:
-            raw = json.load(handle)
-    except Exception:
-        return config
+    # Imported lazily: the registry builds its lookups with this module.
+    from backend import catalog_registry
 
+    return catalog_registry.get_alias_config()
+
+
+def sanitize_alias_config(raw):
+    config = _empty_alias_config()
     if not isinstance(raw, dict):
         return config
 
@@ -106,7 +105,7 @@ def load_alias_config():
     return config
 
 
-def build_label_lookup(mapping_name, mapping):
+def build_label_lookup(mapping_name, mapping, aliases=None):
     lookup = {}
     canonical_by_key = {}
     if not isinstance(mapping, dict):
@@ -122,7 +121,8 @@ def build_label_lookup(mapping_name, mapping):
         for key in iter_lookup_keys(canonical):
             lookup.setdefault(key, canonical)
 
-    aliases = load_alias_config().get(mapping_name, {})
+    if aliases is None:
+        aliases = load_alias_config().get(mapping_name, {})
     for canonical_label, alias_values in aliases.items():
         canonical_key = lookup_key(canonical_label)
         canonical = canonical_by_key.get(canonical_key)
@@ -137,7 +137,7 @@ def build_label_lookup(mapping_name, mapping):
     return lookup
 
 
-def build_code_lookup(mapping_name, mapping):
+def build_code_lookup(mapping_name, mapping, label_lookup=None):
     code_by_canonical_key = {}
     if not isinstance(mapping, dict):
         return {}
@@ -149,7 +149,8 @@ def build_code_lookup(mapping_name, mapping):
         canonical_key = lookup_key(canonical)
         code_by_canonical_key.setdefault(canonical_key, str(code))
 
-    label_lookup = build_label_lookup(mapping_name, mapping)
+    if label_lookup is None:
+        label_lookup = build_label_lookup(mapping_name, mapping)
     code_lookup = {}
     for key, canonical_label in label_lookup.items():
         canonical_key = lookup_key(canonical_label)
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+
+from backend import catalog_normalization
+from backend.config import DATA_DIR
+
+MAPPING_FILENAMES = {
+    "brand": "brand_mapping.json",
+    "color": "color_mapping.json",
+    "material": "material_mapping.json",
+    "attribute": "attribute_mapping.json",
+}
+CATALOG_ALIASES_PATH = os.path.join(DATA_DIR, "catalog_aliases.json")
+WEIGHT_MAPPING_PATH = os.path.join(DATA_DIR, "weight_mapping.json")
+
+_LOCK = threading.RLock()
+_FILE_CACHE = {}
+_DERIVED_CACHE = {}
+
+
+def mapping_path(mapping_name):
+    filename = MAPPING_FILENAMES.get(mapping_name)
+    return os.path.join(DATA_DIR, filename) if filename else None
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_json(path):
+    """
+    Parsed contents of a JSON file, re-read only when its mtime or size
+    changes. Missing or invalid files load as {}. Callers must not mutate
+    the returned object; it is shared.
+    """
+    signature = file_signature(path)
+    with _LOCK:
+        cached = _FILE_CACHE.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        payload = {}
+        if signature is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as handle:
+                    payload = json.load(handle)
+            except Exception:
+                payload = {}
+        _FILE_CACHE[path] = (signature, payload)
+        return payload
+
+
+def cached(key, paths, builder):
+    """
+    Memoize builder() until any of the given files changes on disk.
+    """
+    signature = tuple(file_signature(path) for path in paths)
+    with _LOCK:
+        entry = _DERIVED_CACHE.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        value = builder()
+        _DERIVED_CACHE[key] = (signature, value)
+        return value
+
+
+def clear_cache():
+    with _LOCK:
+        _FILE_CACHE.clear()
+        _DERIVED_CACHE.clear()
+
+
+def catalog_paths():
+    paths = [mapping_path(name) for name in MAPPING_FILENAMES]
+    paths.append(CATALOG_ALIASES_PATH)
+    return paths
+
+
+def catalog_signature():
+    return tuple(file_signature(path) for path in catalog_paths())
+
+
+def _flatten_color_mapping(color_mapping):
+    flattened = {}
+    for key_name, value in color_mapping.items():
+        if isinstance(value, dict):
+            flattened.update(value)
+        else:
+            flattened[key_name] = value
+    return flattened
+
+
+def get_color_categories():
+    payload = load_json(mapping_path("color"))
+    return payload if isinstance(payload, dict) else {}
+
+
+def get_mapping(mapping_name):
+    """
+    Code -> label mapping for brand, color, material, or attribute.
+    Color categories are flattened into a single code -> label map.
+    """
+    path = mapping_path(mapping_name)
+    if path is None:
+        return {}
+    if mapping_name == "color":
+        return cached(("mapping", "color"), [path], lambda: _flatten_color_mapping(get_color_categories()))
+    payload = load_json(path)
+    return payload if isinstance(payload, dict) else {}
+
+
+def get_alias_config():
+    return cached(
+        ("aliases",),
+        [CATALOG_ALIASES_PATH],
+        lambda: catalog_normalization.sanitize_alias_config(load_json(CATALOG_ALIASES_PATH)),
+    )
+
+
+def get_label_lookup(mapping_name):
+    return cached(
+        ("label_lookup", mapping_name),
+        [mapping_path(mapping_name), CATALOG_ALIASES_PATH],
+        lambda: catalog_normalization.build_label_lookup(
+            mapping_name,
+            get_mapping(mapping_name),
+            aliases=get_alias_config().get(mapping_name, {}),
+        ),
+    )
+
+
+def get_code_lookup(mapping_name):
+    return cached(
+        ("code_lookup", mapping_name),
+        [mapping_path(mapping_name), CATALOG_ALIASES_PATH],
+        lambda: catalog_normalization.build_code_lookup(
+            mapping_name,
+            get_mapping(mapping_name),
+            label_lookup=get_label_lookup(mapping_name),
+        ),
+    )
+
+
+def get_weight_mapping():
+    payload = load_json(WEIGHT_MAPPING_PATH)
+    return payload if isinstance(payload, dict) else {}
@@ -1,9 +1,4 @@
-import json
-import os
-
-from backend.config import DATA_DIR
-
-COLOR_MAPPING_PATH = os.path.join(DATA_DIR, "color_mapping.json")
+from backend import catalog_registry
 
 CATEGORY_ALIASES = {
     "gray": ("grey",),
@@ -20,15 +15,6 @@ def _normalize(value):
     return " ".join(str(value or "").split()).strip().lower()
 
 
-def _load_color_mapping():
-    try:
-        with open(COLOR_MAPPING_PATH, "r", encoding="utf-8") as handle:
-            data = json.load(handle)
-            return data if isinstance(data, dict) else {}
-    except Exception:
-        return {}
-
-
 def _category_tokens(category_name):
     normalized_category = _normalize(category_name)
     if not normalized_category:
@@ -42,8 +28,8 @@ def _category_tokens(category_name):
     return tokens
 
 
-def get_color_search_tokens_by_color():
-    mapping = _load_color_mapping()
+def _build_color_search_tokens():
+    mapping = catalog_registry.get_color_categories()
     result = {}
     for category_name, entries in mapping.items():
         if not isinstance(entries, dict):
@@ -65,3 +51,11 @@ def get_color_search_tokens_by_color():
         for color_name, tokens in result.items()
         if tokens
     }
+
+
+def get_color_search_tokens_by_color():
+    return catalog_registry.cached(
+        ("color_search_tokens",),
+        [catalog_registry.mapping_path("color")],
+        _build_color_search_tokens,
+    )
@@ -13,3 +13,8 @@ SETTINGS_PATH = os.getenv("SETTINGS_PATH", DEFAULT_SETTINGS_PATH)
 
 EMPTY_THRESHOLD = float(os.getenv("EMPTY_THRESHOLD", "5"))
 LOW_THRESHOLD = float(os.getenv("LOW_THRESHOLD", "250"))
+
+# Empty: each app process reads the scale itself. Otherwise the Unix socket
+# of a running scale_hub.py, which alone opens the scale.
+DEFAULT_SCALE_HUB_SOCKET = os.path.join(DATA_DIR, "scale_hub.sock")
+SCALE_HUB_SOCKET = os.getenv("SCALE_HUB_SOCKET", "")
@@ -1,8 +1,7 @@
-import json
-import os
 import struct
-import time
 
+from backend import catalog_registry
+from backend.config import SCALE_HUB_SOCKET
 from backend.workbook_store import get_roll_weight as get_roll_weight_db
 
 try:
@@ -14,8 +13,6 @@ VENDOR_ID = 0x0922
 PRODUCT_ID = 0x8003
 FILAMENT_AMOUNT = 1000.0
 
-BASE_DIR = os.path.dirname(__file__)
-WEIGHT_MAPPING_PATH = os.path.join(BASE_DIR, "..", "data", "weight_mapping.json")
 WEIGHT_MAP_LEVEL_ORDER = (
     "brand+color+material+attributes",
     "brand+material+attributes",
@@ -25,57 +22,86 @@ WEIGHT_MAP_LEVEL_ORDER = (
 )
 
 
-def _read_scale_weight_once(timeout_sec: int):
+def decode_scale_report(data):
     """
-    Read a single weight (grams) from the scale once.
-    Returns float grams or None on timeout/error.
+    Weight in grams from one raw scale HID report, or None when the report
+    cannot be decoded.
     """
-    if hid is None:
-        return None
-
-    device = None
     try:
-        device = hid.device()
-        device.open(VENDOR_ID, PRODUCT_ID)
-        device.set_nonblocking(False)
-
-        deadline = time.time() + timeout_sec
-        while time.time() < deadline:
-            data = device.read(6)
-            if not data:
-                time.sleep(0.1)
-                continue
-
-            try:
-                weight_raw = struct.unpack("<h", bytes(data[4:6]))[0]
-            except Exception:
-                return None
-
-            units = "g" if len(data) > 2 and data[2] == 2 else "oz"
-            if units == "oz":
-                return round(weight_raw * 28.3495, 2)
-            return float(weight_raw)
-
-        return None
+        weight_raw = struct.unpack("<h", bytes(data[4:6]))[0]
     except Exception:
         return None
-    finally:
-        try:
-            if device is not None:
-                device.close()
-        except Exception:
-            pass
+
+    units = "g" if len(data) > 2 and data[2] == 2 else "oz"
+    if units == "oz":
+        return round(weight_raw * 28.3495, 2)
+    return float(weight_raw)
+
+
+def scale_reader():
+    """
+    The module serving scale readings: the scale hub client when
+    SCALE_HUB_SOCKET is set, otherwise this process's own background reader.
+    """
+    if SCALE_HUB_SOCKET:
+        from backend import scale_hub_client
+
+        return scale_hub_client
+    from backend import scale_service
+
+    return scale_service
+
+
+def list_scale_devices():
+    """
+    Connected scales as [{"key", "serial", "path", "product"}].
+    """
+    return scale_reader().list_devices()
 
 
-def read_scale_weight(timeout_sec: int = 5, retry_count: int = 1):
+def read_scale_weight(
+    timeout_sec: int = 5,
+    retry_count: int = 1,
+    max_age_sec: float = 1.0,
+    device_key: str = "",
+):
+    """
+    Latest weight (grams) from the background scale reader, no older than
+    max_age_sec. Waits up to timeout_sec x retry_count for a fresh reading.
+    device_key picks a scale from list_scale_devices(); "" is the first one.
+    Returns None when the scale is unavailable.
+    """
     attempts = max(int(retry_count or 1), 1)
     timeout_value = max(int(timeout_sec or 1), 1)
+    return scale_reader().get_weight(
+        max_age_sec=max_age_sec,
+        wait_sec=timeout_value * attempts,
+        device_key=device_key,
+    )
 
-    for _ in range(attempts):
-        reading = _read_scale_weight_once(timeout_sec=timeout_value)
-        if reading is not None:
-            return reading
-    return None
+
+def read_stable_scale_weight(
+    timeout_sec: int = 5,
+    retry_count: int = 1,
+    max_age_sec: float = 1.0,
+    settle_window_sec: float = 1.0,
+    tolerance_g: float = 2.0,
+    device_key: str = "",
+):
+    """
+    Like read_scale_weight, but waits for the scale to settle: every report
+    over settle_window_sec within tolerance_g of each other.
+    Returns (weight, stable); stable is False when the wait ran out first.
+    """
+    attempts = max(int(retry_count or 1), 1)
+    timeout_value = max(int(timeout_sec or 1), 1)
+    return scale_reader().get_stable_weight(
+        settle_window_sec=settle_window_sec,
+        tolerance_g=tolerance_g,
+        max_age_sec=max_age_sec,
+        wait_sec=timeout_value * attempts,
+        device_key=device_key,
+    )
 
 
 def get_starting_weight(timeout_sec: int = 5):
@@ -118,9 +144,7 @@ def _build_weight_key(*parts):
 
 
 def _load_weight_mapping_levels():
-    mapping = _load_json(WEIGHT_MAPPING_PATH)
-    if not isinstance(mapping, dict):
-        return {}
+    mapping = catalog_registry.get_weight_mapping()
     levels = mapping.get("levels")
     return levels if isinstance(levels, dict) else {}
 
@@ -207,15 +231,10 @@ def decode_barcode(barcode: str):
     if len(barcode) != 17 or not barcode.isdigit():
         raise ValueError("Barcode must be exactly 17 digits long.")
 
-    brand_mapping = _load_json(os.path.join(BASE_DIR, "..", "data", "brand_mapping.json"))
-    color_mapping = _load_json(os.path.join(BASE_DIR, "..", "data", "color_mapping.json"))
-    material_mapping = _load_json(os.path.join(BASE_DIR, "..", "data", "material_mapping.json"))
-    attribute_mapping = _load_json(os.path.join(BASE_DIR, "..", "data", "attribute_mapping.json"))
-
-    flat_color_mapping = {}
-    for _, value in color_mapping.items():
-        if isinstance(value, dict):
-            flat_color_mapping.update(value)
+    brand_mapping = catalog_registry.get_mapping("brand")
+    color_mapping = catalog_registry.get_mapping("color")
+    material_mapping = catalog_registry.get_mapping("material")
+    attribute_mapping = catalog_registry.get_mapping("attribute")
 
     brand_code = barcode[:2]
     color_code = barcode[2:5]
@@ -225,7 +244,7 @@ def decode_barcode(barcode: str):
     location_code = barcode[11]
 
     brand = brand_mapping.get(brand_code, "Unknown Brand")
-    color = flat_color_mapping.get(color_code, "Unknown Color")
+    color = color_mapping.get(color_code, "Unknown Color")
     material = material_mapping.get(material_code, "Unknown Material")
     attr1 = attribute_mapping.get(attr1_code, "Unknown Attribute")
     attr2 = attribute_mapping.get(attr2_code, "Unknown Attribute")
@@ -233,10 +252,3 @@ def decode_barcode(barcode: str):
 
     return brand, color, material, attr1, attr2, location
 
-
-def _load_json(filepath):
-    try:
-        with open(filepath, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except Exception:
-        return {}
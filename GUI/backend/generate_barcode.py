@@ -1,30 +1,5 @@
-import json
-import os
-
-from backend import catalog_normalization
-from backend.workbook_store import list_inventory_barcodes
-
-BASE_DIR = os.path.dirname(__file__)
-DATA_DIR = os.path.normpath(os.path.join(BASE_DIR, "..", "data"))
-
-
-def load_json(filename: str) -> dict:
-    path = os.path.join(DATA_DIR, filename)
-    try:
-        with open(path, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except Exception:
-        return {}
-
-
-def _flatten_color_mapping(color_mapping: dict) -> dict:
-    flattened = {}
-    for key, value in color_mapping.items():
-        if isinstance(value, dict):
-            flattened.update(value)
-        else:
-            flattened[key] = value
-    return flattened
+from backend import catalog_normalization, catalog_registry
+from backend.workbook_store import reserve_barcode_serials
 
 
 def _mapping_value_to_code(value: str, mapping_name: str, mapping: dict):
@@ -38,7 +13,7 @@ def _mapping_value_to_code(value: str, mapping_name: str, mapping: dict):
     if not value_keys:
         return None
 
-    code_lookup = catalog_normalization.build_code_lookup(mapping_name, mapping)
+    code_lookup = catalog_registry.get_code_lookup(mapping_name)
     for key in value_keys:
         code = code_lookup.get(key)
         if code is not None:
@@ -54,11 +29,11 @@ def _sorted_values_from_mapping(mapping: dict):
     return [label for _, label in sorted(mapping.items(), key=sort_key)]
 
 
-def get_catalog_options():
-    brand_mapping = load_json("brand_mapping.json")
-    color_mapping = _flatten_color_mapping(load_json("color_mapping.json"))
-    material_mapping = load_json("material_mapping.json")
-    attribute_mapping = load_json("attribute_mapping.json")
+def _build_catalog_options():
+    brand_mapping = catalog_registry.get_mapping("brand")
+    color_mapping = catalog_registry.get_mapping("color")
+    material_mapping = catalog_registry.get_mapping("material")
+    attribute_mapping = catalog_registry.get_mapping("attribute")
 
     attributes = _sorted_values_from_mapping(attribute_mapping)
     if "" not in attributes:
@@ -73,21 +48,20 @@ def get_catalog_options():
     }
 
 
-def generate_filament_barcode(
-    brand: str,
-    color: str,
-    material: str,
-    attribute_1: str,
-    attribute_2: str,
-    location: str,
-    sheet=None,
-) -> str:
-    _ = sheet  # Compatibility with older call sites.
+def get_catalog_options():
+    options = catalog_registry.cached(
+        ("catalog_options",),
+        [catalog_registry.mapping_path(name) for name in catalog_registry.MAPPING_FILENAMES],
+        _build_catalog_options,
+    )
+    return {key: list(values) for key, values in options.items()}
+
 
-    brand_mapping = load_json("brand_mapping.json")
-    color_mapping = _flatten_color_mapping(load_json("color_mapping.json"))
-    material_mapping = load_json("material_mapping.json")
-    attribute_mapping = load_json("attribute_mapping.json")
+def _barcode_prefix(brand, color, material, attribute_1, attribute_2, location):
+    brand_mapping = catalog_registry.get_mapping("brand")
+    color_mapping = catalog_registry.get_mapping("color")
+    material_mapping = catalog_registry.get_mapping("material")
+    attribute_mapping = catalog_registry.get_mapping("attribute")
 
     brand_code = _mapping_value_to_code(brand, "brand", brand_mapping)
     color_code = _mapping_value_to_code(color, "color", color_mapping)
@@ -115,18 +89,42 @@ def generate_filament_barcode(
     if missing:
         raise ValueError("Invalid selection for: " + ", ".join(missing))
 
-    unique_ids = []
-    for existing in list_inventory_barcodes():
-        if existing.isdigit() and len(existing) == 17:
-            try:
-                unique_ids.append(int(existing[-5:]))
-            except Exception:
-                continue
-
-    next_unique_id = max(unique_ids, default=0) + 1
-    unique_id_str = f"{next_unique_id:05}"
-
     return (
         f"{brand_code}{color_code}{material_code}"
-        f"{attribute_1_code}{attribute_2_code}{location_code}{unique_id_str}"
+        f"{attribute_1_code}{attribute_2_code}{location_code}"
     )
+
+
+def generate_filament_barcode(
+    brand: str,
+    color: str,
+    material: str,
+    attribute_1: str,
+    attribute_2: str,
+    location: str,
+    sheet=None,
+    conn=None,
+) -> str:
+    _ = sheet  # Compatibility with older call sites.
+
+    prefix = _barcode_prefix(brand, color, material, attribute_1, attribute_2, location)
+    serial = reserve_barcode_serials(1, conn=conn)
+    return f"{prefix}{serial:05}"
+
+
+def generate_filament_barcodes(
+    count: int,
+    brand: str,
+    color: str,
+    material: str,
+    attribute_1: str,
+    attribute_2: str,
+    location: str,
+    conn=None,
+) -> list:
+    """
+    Reserve a block of consecutive serials for bulk intake of identical rolls.
+    """
+    prefix = _barcode_prefix(brand, color, material, attribute_1, attribute_2, location)
+    first_serial = reserve_barcode_serials(count, conn=conn)
+    return [f"{prefix}{serial:05}" for serial in range(first_serial, first_serial + int(count))]
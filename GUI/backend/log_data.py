@@ -2,13 +2,41 @@ from datetime import datetime
 
 from backend import generate_barcode
 from backend.config import EMPTY_THRESHOLD
-from backend.workbook_store import normalize_text_case, open_database
+from backend.workbook_store import (
+    add_usage_rollups,
+    advance_barcode_sequence,
+    insert_usage_events,
+    normalize_event_type,
+    normalize_text_case,
+    open_database,
+    open_roll_version,
+    roll_weight_from_row,
+    timestamp_epoch,
+)
+
+MAX_BATCH_ENTRIES = 1000
+_BATCH_LOOKUP_CHUNK_SIZE = 500
+_TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M")
 
 
 def _timestamp_now():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
+def _parse_entry_timestamp(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError("Timestamp must be in YYYY-MM-DD HH:MM:SS format.")
+
+
 def _to_float(value, default=None):
     try:
         return float(value)
@@ -23,6 +51,56 @@ def _to_int(value, default=0):
         return default
 
 
+def _event_row(
+    timestamp,
+    event_type,
+    barcode,
+    brand,
+    color,
+    material,
+    attr1,
+    attr2,
+    location,
+    input_weight,
+    roll_weight,
+    filament_amount,
+    delta_used,
+    times_logged_out,
+    source,
+):
+    return (
+        timestamp,
+        normalize_event_type(event_type),
+        barcode,
+        normalize_text_case(brand, field="brand"),
+        normalize_text_case(color, field="color"),
+        normalize_text_case(material, field="material"),
+        normalize_text_case(attr1, field="attribute_1"),
+        normalize_text_case(attr2, field="attribute_2"),
+        normalize_text_case(location, field="location"),
+        input_weight,
+        roll_weight,
+        filament_amount,
+        delta_used,
+        times_logged_out,
+        source,
+        timestamp_epoch(timestamp),
+    )
+
+
+def _append_events(conn, rows):
+    if rows:
+        version_ids = insert_usage_events(conn, rows)
+        add_usage_rollups(
+            conn,
+            [
+                (row[0], version_id, row[12])
+                for row, version_id in zip(rows, version_ids)
+                if row[1] == "log_usage"
+            ],
+        )
+
+
 def _append_event(
     conn,
     timestamp,
@@ -41,50 +119,27 @@ def _append_event(
     times_logged_out,
     source,
 ):
-    brand = normalize_text_case(brand, field="brand")
-    color = normalize_text_case(color, field="color")
-    material = normalize_text_case(material, field="material")
-    attr1 = normalize_text_case(attr1, field="attribute_1")
-    attr2 = normalize_text_case(attr2, field="attribute_2")
-    location = normalize_text_case(location, field="location")
-
-    conn.execute(
-        """
-        INSERT INTO usage_events (
-            timestamp,
-            event_type,
-            barcode,
-            brand,
-            color,
-            material,
-            attribute_1,
-            attribute_2,
-            location,
-            input_weight,
-            roll_weight,
-            filament_amount,
-            delta_used,
-            times_logged_out,
-            source
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            timestamp,
-            event_type,
-            barcode,
-            brand,
-            color,
-            material,
-            attr1,
-            attr2,
-            location,
-            input_weight,
-            roll_weight,
-            filament_amount,
-            delta_used,
-            times_logged_out,
-            source,
-        ),
+    _append_events(
+        conn,
+        [
+            _event_row(
+                timestamp,
+                event_type,
+                barcode,
+                brand,
+                color,
+                material,
+                attr1,
+                attr2,
+                location,
+                input_weight,
+                roll_weight,
+                filament_amount,
+                delta_used,
+                times_logged_out,
+                source,
+            )
+        ],
     )
 
 
@@ -145,6 +200,7 @@ def log_filament_data_web(
             UPDATE inventory
             SET
                 timestamp = ?,
+                ts_epoch = ?,
                 filament_amount = ?,
                 roll_weight = ?,
                 times_logged_out = ?,
@@ -153,6 +209,7 @@ def log_filament_data_web(
             """,
             (
                 timestamp,
+                timestamp_epoch(timestamp),
                 new_amount,
                 updated_roll_weight,
                 times_logged_out,
@@ -194,6 +251,206 @@ def log_filament_data_web(
     return False
 
 
+def _load_inventory_rows_by_barcode(conn, barcodes):
+    rows_by_barcode = {}
+    unique_barcodes = list(dict.fromkeys(barcodes))
+    for start in range(0, len(unique_barcodes), _BATCH_LOOKUP_CHUNK_SIZE):
+        chunk = unique_barcodes[start:start + _BATCH_LOOKUP_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT
+                barcode,
+                brand,
+                color,
+                material,
+                attribute_1,
+                attribute_2,
+                location,
+                filament_amount,
+                roll_weight,
+                times_logged_out,
+                timestamp,
+                is_empty
+            FROM inventory
+            WHERE barcode IN ({placeholders})
+            """,
+            tuple(chunk),
+        ).fetchall()
+        for row in rows:
+            rows_by_barcode[row["barcode"]] = row
+    return rows_by_barcode
+
+
+def _reading_before(conn, barcode, timestamp):
+    row = conn.execute(
+        """
+        SELECT timestamp, filament_amount
+        FROM usage_event_log
+        WHERE barcode = ? AND ts_epoch <= ? AND filament_amount IS NOT NULL
+        ORDER BY ts_epoch DESC, id DESC
+        LIMIT 1
+        """,
+        (barcode, timestamp_epoch(timestamp)),
+    ).fetchone()
+    if row is None:
+        return None
+    return str(row["timestamp"] or ""), _to_float(row["filament_amount"])
+
+
+def log_filament_batch_web(
+    entries,
+    source="web_batch",
+    empty_threshold=EMPTY_THRESHOLD,
+):
+    """
+    Log many {barcode, weight, timestamp?} entries in one transaction.
+    weight is the measured total weight; the stored roll weight is subtracted.
+    Returns one result dict per entry, in input order.
+    """
+    threshold_value = _to_float(empty_threshold, default=EMPTY_THRESHOLD)
+    now_text = _timestamp_now()
+
+    results = []
+    parsed = []
+    for index, entry in enumerate(entries or []):
+        item = entry if isinstance(entry, dict) else {}
+        barcode = str(item.get("barcode") or "").strip()
+        result = {"index": index, "barcode": barcode, "status": "error"}
+        results.append(result)
+
+        if not barcode:
+            result["error"] = "Barcode is required."
+            continue
+
+        measured_weight = _to_float(str(item.get("weight", "")).strip().replace(",", ""))
+        if measured_weight is None:
+            result["error"] = "Weight must be a valid number."
+            continue
+
+        try:
+            timestamp = _parse_entry_timestamp(item.get("timestamp")) or now_text
+        except ValueError as exc:
+            result["error"] = str(exc)
+            continue
+        if timestamp > now_text:
+            result["error"] = "Timestamp cannot be in the future."
+            continue
+
+        parsed.append((result, barcode, measured_weight, timestamp))
+
+    if not parsed:
+        return results
+
+    with open_database(write=True) as conn:
+        rows_by_barcode = _load_inventory_rows_by_barcode(conn, [item[1] for item in parsed])
+
+        # Each roll's entries are applied oldest first, so every delta is
+        # measured against the reading before it in time and only the newest
+        # reading becomes the roll's current state.
+        entries_by_barcode = {}
+        for item in parsed:
+            entries_by_barcode.setdefault(item[1], []).append(item)
+
+        updates = []
+        event_rows = []
+        for barcode, roll_entries in entries_by_barcode.items():
+            row = rows_by_barcode.get(barcode)
+            if row is None:
+                for result, *_ in roll_entries:
+                    result["error"] = "Barcode not found. Please add this roll first."
+                continue
+
+            roll_weight_value = roll_weight_from_row(row)
+            if roll_weight_value is None:
+                for result, *_ in roll_entries:
+                    result["error"] = "Roll weight not found for this barcode."
+                continue
+            event_roll_weight = round(float(roll_weight_value), 2)
+
+            stored = (str(row["timestamp"] or ""), _to_float(row["filament_amount"]))
+            times_logged_out = _to_int(row["times_logged_out"], default=0)
+            previous = newest = None
+            for result, _, measured_weight, timestamp in sorted(roll_entries, key=lambda item: item[3]):
+                new_amount = round(measured_weight - float(roll_weight_value), 2)
+                if new_amount < 0:
+                    result["error"] = "Weight is below the recorded roll weight."
+                    continue
+
+                # The latest earlier reading: the roll's stored one, or for an
+                # entry dated before it, the logged one it follows.
+                before = stored if stored[0] <= timestamp else _reading_before(conn, barcode, timestamp)
+                if previous is None or (before is not None and before[0] > previous[0]):
+                    previous = before
+                delta_used = None
+                if previous is not None and previous[1] is not None:
+                    delta_used = round(max(previous[1] - new_amount, 0.0), 2)
+
+                times_logged_out += 1
+                is_empty = 1 if new_amount <= threshold_value else 0
+                previous = newest = (timestamp, new_amount, is_empty)
+
+                event_rows.append(
+                    _event_row(
+                        timestamp=timestamp,
+                        event_type="log_usage",
+                        barcode=barcode,
+                        brand=row["brand"],
+                        color=row["color"],
+                        material=row["material"],
+                        attr1=row["attribute_1"],
+                        attr2=row["attribute_2"],
+                        location=row["location"],
+                        input_weight=round(measured_weight, 2),
+                        roll_weight=event_roll_weight,
+                        filament_amount=new_amount,
+                        delta_used=delta_used,
+                        times_logged_out=times_logged_out,
+                        source=source,
+                    )
+                )
+
+                result.update(
+                    {
+                        "status": "logged",
+                        "timestamp": timestamp,
+                        "filament_amount": new_amount,
+                        "delta_used": delta_used,
+                        "is_empty": bool(is_empty),
+                    }
+                )
+
+            if newest is None:
+                continue
+            if newest[0] >= stored[0]:
+                current = (newest[0], newest[1], event_roll_weight, newest[2])
+            else:
+                # Every entry predates the roll's last reading, which stays.
+                current = (stored[0], row["filament_amount"], row["roll_weight"], row["is_empty"])
+            updates.append(
+                (current[0], timestamp_epoch(current[0])) + current[1:] + (times_logged_out, barcode)
+            )
+
+        if updates:
+            conn.executemany(
+                """
+                UPDATE inventory
+                SET
+                    timestamp = ?,
+                    ts_epoch = ?,
+                    filament_amount = ?,
+                    roll_weight = ?,
+                    is_empty = ?,
+                    times_logged_out = ?
+                WHERE barcode = ?
+                """,
+                updates,
+            )
+        _append_events(conn, event_rows)
+
+    return results
+
+
 def add_new_roll_web(
     brand,
     color,
@@ -229,19 +486,21 @@ def add_new_roll_web(
     attr2 = normalize_text_case(attr2, field="attribute_2")
     location = normalize_text_case(location, field="location")
 
-    if not barcode:
-        barcode = generate_barcode.generate_filament_barcode(
-            brand,
-            color,
-            material,
-            attr1,
-            attr2,
-            location,
-            sheet=None,
-        )
-
-    barcode = str(barcode).strip()
+    barcode = str(barcode or "").strip()
     with open_database(write=True) as conn:
+        if not barcode:
+            # Reserved in the same transaction as the insert.
+            barcode = generate_barcode.generate_filament_barcode(
+                brand,
+                color,
+                material,
+                attr1,
+                attr2,
+                location,
+                sheet=None,
+                conn=conn,
+            )
+
         existing = conn.execute(
             "SELECT 1 FROM inventory WHERE barcode = ? LIMIT 1",
             (barcode,),
@@ -265,8 +524,9 @@ def add_new_roll_web(
                 roll_weight,
                 times_logged_out,
                 is_empty,
-                is_favorite
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                is_favorite,
+                ts_epoch
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 timestamp,
@@ -282,8 +542,11 @@ def add_new_roll_web(
                 0,
                 is_empty,
                 0,
+                timestamp_epoch(timestamp),
             ),
         )
+        advance_barcode_sequence(conn, barcode)
+        open_roll_version(conn, barcode, (brand, color, material, attr1, attr2, location), timestamp)
 
         _append_event(
             conn=conn,
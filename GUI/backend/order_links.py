@@ -1,7 +1,7 @@
-import json
 import os
 from urllib.parse import quote_plus
 
+from backend import catalog_registry
 from backend.config import DATA_DIR
 
 DEFAULT_ORDER_LINKS_PATH = os.path.join(DATA_DIR, "order_links.json")
@@ -63,13 +63,9 @@ def get_order_links_path():
     return configured or DEFAULT_ORDER_LINKS_PATH
 
 
-def load_order_links_config():
-    path = get_order_links_path()
-    raw = {}
-    try:
-        with open(path, "r", encoding="utf-8") as handle:
-            raw = json.load(handle)
-    except Exception:
+def _build_order_links_config(path):
+    raw = catalog_registry.load_json(path)
+    if not isinstance(raw, dict):
         raw = {}
 
     default_entry = _sanitize_entry(raw.get("default"), DEFAULT_ORDER_LINKS["default"])
@@ -92,6 +88,11 @@ def load_order_links_config():
     return config
 
 
+def load_order_links_config():
+    path = get_order_links_path()
+    return catalog_registry.cached(("order_links", path), [path], lambda: _build_order_links_config(path))
+
+
 def _is_safe_template(template):
     return template.startswith("https://") or template.startswith("http://")
 
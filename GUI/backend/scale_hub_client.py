@@ -0,0 +1,128 @@
+import json
+import socket
+
+from backend.config import SCALE_HUB_SOCKET
+
+CONNECT_TIMEOUT_SEC = 2.0
+# Extra time allowed for the hub's reply beyond the read's own wait.
+REPLY_MARGIN_SEC = 2.0
+# A stream without even a keep-alive for this long is treated as dead.
+STREAM_SILENCE_SEC = 45.0
+
+_UNAVAILABLE = {"status": "unavailable", "weight": None, "stable": False}
+
+
+def _connect(timeout_sec):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT_SEC)
+    try:
+        sock.connect(SCALE_HUB_SOCKET)
+    except Exception:
+        sock.close()
+        raise
+    sock.settimeout(timeout_sec)
+    return sock
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _request(message, timeout_sec):
+    """
+    Send one request line to the hub and return its decoded reply, or None
+    when the hub cannot be reached.
+    """
+    try:
+        with _connect(timeout_sec) as sock:
+            _send(sock, message)
+            with sock.makefile("rb") as reply:
+                line = reply.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def list_devices():
+    reply = _request({"op": "devices"}, CONNECT_TIMEOUT_SEC + REPLY_MARGIN_SEC)
+    return reply.get("devices", []) if isinstance(reply, dict) else []
+
+
+def get_weight(max_age_sec=1.0, wait_sec=5.0, device_key=""):
+    reply = _request(
+        {"op": "weight", "max_age_sec": max_age_sec, "wait_sec": wait_sec, "device": device_key},
+        float(wait_sec) + REPLY_MARGIN_SEC,
+    )
+    return None if reply is None else reply.get("weight")
+
+
+def get_stable_weight(
+    settle_window_sec=1.0,
+    tolerance_g=2.0,
+    max_age_sec=1.0,
+    wait_sec=5.0,
+    device_key="",
+):
+    reply = _request(
+        {
+            "op": "stable",
+            "device": device_key,
+            "settle_window_sec": settle_window_sec,
+            "tolerance_g": tolerance_g,
+            "max_age_sec": max_age_sec,
+            "wait_sec": wait_sec,
+        },
+        float(wait_sec) + REPLY_MARGIN_SEC,
+    )
+    if reply is None:
+        return None, False
+    return reply.get("weight"), bool(reply.get("stable"))
+
+
+def latest_reading(device_key=""):
+    reply = _request({"op": "latest", "device": device_key}, CONNECT_TIMEOUT_SEC + REPLY_MARGIN_SEC)
+    if reply is None:
+        return {
+            "status": "unavailable",
+            "weight": None,
+            "read_at": None,
+            "age_sec": None,
+            "error": "Scale hub unavailable",
+        }
+    return reply
+
+
+def stream_readings(
+    settle_window_sec=1.0,
+    tolerance_g=2.0,
+    max_age_sec=1.0,
+    keepalive_sec=None,
+    device_key="",
+):
+    """
+    Same readings as scale_service.stream_readings, relayed from the hub's
+    own stream. Yields one unavailable reading and stops if the hub goes away.
+    """
+    message = {
+        "op": "stream",
+        "device": device_key,
+        "settle_window_sec": settle_window_sec,
+        "tolerance_g": tolerance_g,
+        "max_age_sec": max_age_sec,
+    }
+    silence_sec = STREAM_SILENCE_SEC
+    if keepalive_sec is not None:
+        message["keepalive_sec"] = keepalive_sec
+        silence_sec = float(keepalive_sec) * 3
+    try:
+        # The hub sends at least a keep-alive every keepalive_sec, so a
+        # silent socket means it is gone.
+        with _connect(silence_sec) as sock:
+            _send(sock, message)
+            with sock.makefile("rb") as lines:
+                for line in lines:
+                    reading = json.loads(line)
+                    yield None if reading.get("keepalive") else reading
+    except (OSError, ValueError, AttributeError):
+        pass
+    yield dict(_UNAVAILABLE)
@@ -0,0 +1,362 @@
+import os
+import threading
+import time
+from collections import deque
+
+from backend import data_manipulation
+
+READ_TIMEOUT_MS = 250
+REOPEN_DELAY_SEC = 1.0
+HISTORY_SEC = 10.0
+IDLE_STOP_SEC = 30.0
+STREAM_KEEPALIVE_SEC = 15.0
+
+_CONDITION = threading.Condition()
+# One reader per scale, keyed by device key: "" for the first matching scale,
+# otherwise "serial:<serial>" or "path:<HID path>" as listed by list_devices().
+_POOL = {"pid": None, "readers": {}}
+
+
+def _new_reader(device_key):
+    # status is "starting" until the first open attempt, then "connected",
+    # "unavailable" or, after going idle, "stopped". read_at is
+    # time.monotonic() of the latest reading. history holds
+    # (time.monotonic(), grams) for every report of the last HISTORY_SEC
+    # seconds of the current connection. last_demand is time.monotonic() of
+    # the latest read request; the reader closes the device once nothing has
+    # asked for IDLE_STOP_SEC and no stream is subscribed.
+    return {
+        "device_key": device_key,
+        "thread": None,
+        "subscribers": 0,
+        "last_demand": 0.0,
+        "status": "starting",
+        "weight": None,
+        "read_at": None,
+        "read_at_wall": None,
+        "error": "",
+        "history": deque(),
+    }
+
+
+def _reader(device_key):
+    # Caller holds _CONDITION. Threads do not survive a fork, so a new
+    # process starts with an empty pool.
+    pid = os.getpid()
+    if _POOL["pid"] != pid:
+        _POOL["pid"] = pid
+        _POOL["readers"] = {}
+    reader = _POOL["readers"].get(device_key)
+    if reader is None:
+        reader = _POOL["readers"][device_key] = _new_reader(device_key)
+    return reader
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return str(value or "")
+
+
+def _device_key(info):
+    serial = _text(info.get("serial_number")).strip()
+    return f"serial:{serial}" if serial else f"path:{_text(info.get('path'))}"
+
+
+def _enumerate():
+    hid = data_manipulation.hid
+    if hid is None:
+        return []
+    try:
+        return hid.enumerate(data_manipulation.VENDOR_ID, data_manipulation.PRODUCT_ID)
+    except Exception:
+        return []
+
+
+def list_devices():
+    """
+    Every connected scale: [{"key", "serial", "path", "product"}], in
+    enumeration order. key is what station settings map to.
+    """
+    devices = []
+    seen = set()
+    for info in _enumerate():
+        key = _device_key(info)
+        if key in seen:
+            continue
+        seen.add(key)
+        devices.append(
+            {
+                "key": key,
+                "serial": _text(info.get("serial_number")).strip(),
+                "path": _text(info.get("path")),
+                "product": _text(info.get("product_string")).strip(),
+            }
+        )
+    return devices
+
+
+def resolve_device_key(device_key=""):
+    """
+    The pool key for device_key. "" (the first matching scale) resolves to
+    that scale's own key, so a station mapped to the same scale shares its
+    reader; it stays "" only when no scale is listed.
+    """
+    if device_key:
+        return device_key
+    devices = list_devices()
+    return devices[0]["key"] if devices else ""
+
+
+def _open_device(device_key):
+    device = data_manipulation.hid.device()
+    if not device_key:
+        device.open(data_manipulation.VENDOR_ID, data_manipulation.PRODUCT_ID)
+    else:
+        info = next((info for info in _enumerate() if _device_key(info) == device_key), None)
+        if info is None:
+            raise OSError(f"Scale {device_key} is not connected")
+        device.open_path(info["path"])
+    device.set_nonblocking(False)
+    return device
+
+
+def _is_idle(reader):
+    return reader["subscribers"] == 0 and time.monotonic() - reader["last_demand"] > IDLE_STOP_SEC
+
+
+def _stop_if_idle(reader):
+    # Checked under the lock start() takes, so a reader that stops has
+    # already left its slot free for the next start().
+    with _CONDITION:
+        if not _is_idle(reader):
+            return False
+        reader["thread"] = None
+        reader["status"] = "stopped"
+        _CONDITION.notify_all()
+        return True
+
+
+def _set_state(reader, **values):
+    with _CONDITION:
+        reader.update(values)
+        _CONDITION.notify_all()
+
+
+def _publish(reader, weight):
+    now = time.monotonic()
+    with _CONDITION:
+        history = reader["history"]
+        history.append((now, weight))
+        while history[0][0] < now - HISTORY_SEC:
+            history.popleft()
+        reader.update(status="connected", weight=weight, read_at=now, read_at_wall=time.time(), error="")
+        _CONDITION.notify_all()
+
+
+def _read_reports(reader, device):
+    while not _is_idle(reader):
+        # A bounded read so a silent scale still lets the loop notice errors.
+        data = device.read(6, READ_TIMEOUT_MS)
+        if not data:
+            continue
+        weight = data_manipulation.decode_scale_report(data)
+        if weight is not None:
+            _publish(reader, weight)
+
+
+def _reader_loop(reader):
+    while not _stop_if_idle(reader):
+        device = None
+        failed = False
+        try:
+            device = _open_device(reader["device_key"])
+            with _CONDITION:
+                # Reports from before a reconnect say nothing about settling.
+                reader["history"].clear()
+            _set_state(reader, status="connected", error="")
+            _read_reports(reader, device)
+        except Exception as exc:
+            _set_state(reader, status="unavailable", error=str(exc))
+            failed = True
+        finally:
+            try:
+                if device is not None:
+                    device.close()
+            except Exception:
+                pass
+        if failed:
+            time.sleep(REOPEN_DELAY_SEC)
+
+
+def start(device_key=""):
+    """
+    Start the background reader for the scale if it is not running, and
+    keep it from going idle. Returns False when HID support is not installed.
+    """
+    if data_manipulation.hid is None:
+        return False
+    device_key = resolve_device_key(device_key)
+    with _CONDITION:
+        reader = _reader(device_key)
+        reader["last_demand"] = time.monotonic()
+        thread = reader["thread"]
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(
+                target=_reader_loop,
+                args=(reader,),
+                name=f"filament-scale-reader {device_key or 'default'}",
+                daemon=True,
+            )
+            reader["thread"] = thread
+            reader.update(status="starting", weight=None, read_at=None, read_at_wall=None, error="")
+            reader["history"].clear()
+            thread.start()
+    return True
+
+
+def _fresh_weight(reader, max_age_sec):
+    read_at = reader["read_at"]
+    if read_at is None or time.monotonic() - read_at > max_age_sec:
+        return None
+    return reader["weight"]
+
+
+def latest_reading(device_key=""):
+    """
+    The latest reading without waiting: {"status", "weight", "read_at",
+    "age_sec", "error"}. read_at is a Unix timestamp.
+    """
+    device_key = resolve_device_key(device_key)
+    with _CONDITION:
+        reader = _reader(device_key)
+        read_at = reader["read_at"]
+        return {
+            "status": reader["status"],
+            "weight": reader["weight"],
+            "read_at": reader["read_at_wall"],
+            "age_sec": None if read_at is None else round(time.monotonic() - read_at, 3),
+            "error": reader["error"],
+        }
+
+
+def get_weight(max_age_sec=1.0, wait_sec=5.0, device_key=""):
+    """
+    The latest weight in grams if it is at most max_age_sec old. Otherwise
+    waits up to wait_sec for the reader to publish one. Returns None at
+    once when the scale could not be opened.
+    """
+    device_key = resolve_device_key(device_key)
+    if not start(device_key):
+        return None
+    max_age_sec = max(float(max_age_sec), 0.0)
+    deadline = time.monotonic() + max(float(wait_sec), 0.0)
+    with _CONDITION:
+        reader = _reader(device_key)
+        while True:
+            weight = _fresh_weight(reader, max_age_sec)
+            if weight is not None:
+                return weight
+            if reader["status"] == "unavailable":
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            _CONDITION.wait(remaining)
+
+
+def _settled_weight(reader, settle_window_sec, tolerance_g, max_age_sec):
+    history = reader["history"]
+    now = time.monotonic()
+    window_start = now - settle_window_sec
+    # The scale must have been reporting for the whole window, and still be.
+    if not history or history[0][0] > window_start or now - history[-1][0] > max_age_sec:
+        return None
+    weights = sorted(weight for read_at, weight in history if read_at >= window_start)
+    if not weights or weights[-1] - weights[0] > tolerance_g:
+        return None
+    return round(weights[len(weights) // 2], 2)
+
+
+def get_stable_weight(
+    settle_window_sec=1.0,
+    tolerance_g=2.0,
+    max_age_sec=1.0,
+    wait_sec=5.0,
+    device_key="",
+):
+    """
+    (grams, stable). stable is True once every report over the last
+    settle_window_sec is within tolerance_g, and grams is their median.
+    If the scale does not settle within wait_sec, returns the latest fresh
+    weight with stable False; (None, False) when there is none.
+    """
+    device_key = resolve_device_key(device_key)
+    if not start(device_key):
+        return None, False
+    settle_window_sec = max(float(settle_window_sec), 0.0)
+    tolerance_g = max(float(tolerance_g), 0.0)
+    max_age_sec = max(float(max_age_sec), 0.0)
+    deadline = time.monotonic() + max(float(wait_sec), 0.0)
+    with _CONDITION:
+        reader = _reader(device_key)
+        while True:
+            weight = _settled_weight(reader, settle_window_sec, tolerance_g, max_age_sec)
+            if weight is not None:
+                return weight, True
+            remaining = deadline - time.monotonic()
+            if reader["status"] == "unavailable" or remaining <= 0:
+                return _fresh_weight(reader, max_age_sec), False
+            _CONDITION.wait(remaining)
+
+
+def _stream_reading(reader, settle_window_sec, tolerance_g, max_age_sec):
+    settled = _settled_weight(reader, settle_window_sec, tolerance_g, max_age_sec)
+    return {
+        "status": reader["status"],
+        "weight": settled if settled is not None else _fresh_weight(reader, max_age_sec),
+        "stable": settled is not None,
+    }
+
+
+def stream_readings(
+    settle_window_sec=1.0,
+    tolerance_g=2.0,
+    max_age_sec=1.0,
+    keepalive_sec=None,
+    device_key="",
+):
+    """
+    Yield {"status", "weight", "stable"} each time the weight or scale
+    status changes, and None after keepalive_sec without a change. The
+    device stays open while any stream is being consumed.
+    """
+    if keepalive_sec is None:
+        keepalive_sec = STREAM_KEEPALIVE_SEC
+    device_key = resolve_device_key(device_key)
+    with _CONDITION:
+        reader = _reader(device_key)
+        reader["subscribers"] += 1
+    try:
+        last = None
+        sent_at = time.monotonic()
+        while True:
+            available = start(device_key)
+            with _CONDITION:
+                if available:
+                    reading = _stream_reading(reader, settle_window_sec, tolerance_g, max_age_sec)
+                else:
+                    reading = {"status": "unavailable", "weight": None, "stable": False}
+                if reading == last:
+                    remaining = sent_at + keepalive_sec - time.monotonic()
+                    if remaining > 0:
+                        _CONDITION.wait(remaining)
+                        continue
+                    reading = None
+            if reading is not None:
+                last = reading
+            sent_at = time.monotonic()
+            yield reading
+    finally:
+        with _CONDITION:
+            reader["subscribers"] = max(reader["subscribers"] - 1, 0)
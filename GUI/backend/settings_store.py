@@ -15,6 +15,10 @@ USED_ROLL_MAP_LEVEL_OPTIONS = (
     "material",
 )
 NEGATIVE_FILAMENT_POLICY_OPTIONS = ("block", "warn", "clamp_to_zero")
+STORAGE_PROFILE_OPTIONS = ("safe", "balanced", "fast")
+ANALYTICS_ATTRIBUTION_OPTIONS = ("current", "event_time")
+ANALYTICS_ENGINE_OPTIONS = ("sql", "columnar")
+SCALE_READ_MODE_OPTIONS = ("stable", "latest")
 
 DEFAULT_SETTINGS = {
     "theme": "light",
@@ -30,10 +34,18 @@ DEFAULT_SETTINGS = {
     "used_roll_map_min_samples": 1,
     "scale_timeout_sec": 5,
     "scale_retry_count": 2,
+    "scale_max_age_ms": 1000,
+    "scale_read_mode": "stable",
+    "scale_settle_window_ms": 1000,
+    "scale_settle_tolerance_g": 2.0,
+    "scale_stations": {},
     "auto_read_scale_on_weight_step": False,
     "negative_filament_policy": "block",
     "auto_backup_on_write": False,
     "backup_retention_days": 30,
+    "storage_profile": "balanced",
+    "analytics_attribution": "current",
+    "analytics_engine": "sql",
     "low_stock_alerts": True,
     "onboarding_completed": False,
     "onboarding_completed_at": "",
@@ -69,6 +81,29 @@ def _to_bool(value, default=False):
     return bool(value)
 
 
+def _to_station_map(value):
+    # {station: scale device key}, from a dict or from "station = device key"
+    # lines as typed in the settings form. Station names are case-insensitive.
+    if isinstance(value, str):
+        pairs = []
+        for line in value.splitlines():
+            station, separator, device_key = line.partition("=")
+            if separator:
+                pairs.append((station, device_key))
+    elif isinstance(value, dict):
+        pairs = value.items()
+    else:
+        return {}
+
+    stations = {}
+    for station, device_key in pairs:
+        station = str(station or "").strip().lower()
+        device_key = str(device_key or "").strip()
+        if station and device_key:
+            stations[station] = device_key
+    return stations
+
+
 def sanitize_settings(raw):
     settings = deepcopy(DEFAULT_SETTINGS)
     if isinstance(raw, dict):
@@ -130,6 +165,34 @@ def sanitize_settings(raw):
         1,
         10,
     )
+    settings["scale_max_age_ms"] = _to_int(
+        settings.get("scale_max_age_ms"),
+        DEFAULT_SETTINGS["scale_max_age_ms"],
+        100,
+        60000,
+    )
+
+    scale_read_mode = str(
+        settings.get("scale_read_mode", DEFAULT_SETTINGS["scale_read_mode"])
+    ).strip().lower()
+    settings["scale_read_mode"] = (
+        scale_read_mode
+        if scale_read_mode in SCALE_READ_MODE_OPTIONS
+        else DEFAULT_SETTINGS["scale_read_mode"]
+    )
+    settings["scale_settle_window_ms"] = _to_int(
+        settings.get("scale_settle_window_ms"),
+        DEFAULT_SETTINGS["scale_settle_window_ms"],
+        100,
+        5000,
+    )
+    settings["scale_settle_tolerance_g"] = _to_float(
+        settings.get("scale_settle_tolerance_g"),
+        DEFAULT_SETTINGS["scale_settle_tolerance_g"],
+        0.0,
+        100.0,
+    )
+    settings["scale_stations"] = _to_station_map(settings.get("scale_stations"))
 
     settings["auto_read_scale_on_weight_step"] = _to_bool(
         settings.get("auto_read_scale_on_weight_step"),
@@ -155,6 +218,33 @@ def sanitize_settings(raw):
         3650,
     )
 
+    storage_profile = str(
+        settings.get("storage_profile", DEFAULT_SETTINGS["storage_profile"])
+    ).strip().lower()
+    settings["storage_profile"] = (
+        storage_profile
+        if storage_profile in STORAGE_PROFILE_OPTIONS
+        else DEFAULT_SETTINGS["storage_profile"]
+    )
+
+    analytics_attribution = str(
+        settings.get("analytics_attribution", DEFAULT_SETTINGS["analytics_attribution"])
+    ).strip().lower()
+    settings["analytics_attribution"] = (
+        analytics_attribution
+        if analytics_attribution in ANALYTICS_ATTRIBUTION_OPTIONS
+        else DEFAULT_SETTINGS["analytics_attribution"]
+    )
+
+    analytics_engine = str(
+        settings.get("analytics_engine", DEFAULT_SETTINGS["analytics_engine"])
+    ).strip().lower()
+    settings["analytics_engine"] = (
+        analytics_engine
+        if analytics_engine in ANALYTICS_ENGINE_OPTIONS
+        else DEFAULT_SETTINGS["analytics_engine"]
+    )
+
     settings["low_stock_alerts"] = _to_bool(
         settings.get("low_stock_alerts", DEFAULT_SETTINGS["low_stock_alerts"]),
         DEFAULT_SETTINGS["low_stock_alerts"],
@@ -1,25 +1,20 @@
+import heapq
 from datetime import datetime, timedelta
 
+from backend import usage_columns, usage_cube
 from backend.config import EMPTY_THRESHOLD, LOW_THRESHOLD
-from backend.workbook_store import list_inventory_rows, normalize_text_case, open_database
-
-
-def _parse_timestamp(value):
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value
-    text = str(value).strip()
-    if not text:
-        return None
-
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-        try:
-            return datetime.strptime(text, fmt)
-        except ValueError:
-            continue
-
-    return None
+from backend.workbook_store import (
+    DEFAULT_ATTRIBUTION,
+    decode_inventory_cursor,
+    decode_keyset_cursor,
+    encode_inventory_cursor,
+    encode_keyset_cursor,
+    list_empty_inventory_rows,
+    list_inventory_rows,
+    normalize_text_case,
+    open_database,
+    timestamp_epoch,
+)
 
 
 def _to_float(value, default=None):
@@ -36,190 +31,287 @@ def _to_int(value, default=0):
         return default
 
 
-def _normalize_label(value, field=None, fallback="Unknown"):
-    text = normalize_text_case(value, field=field)
-    return text if text else fallback
+def _inventory_record(row):
+    barcode = ""
+    if row and len(row) > 1 and row[1] is not None:
+        barcode = str(row[1]).strip()
+
+    return {
+        "last_logged": row[0] if len(row) > 0 else None,
+        "barcode": barcode,
+        "brand": row[2] if len(row) > 2 else None,
+        "color": row[3] if len(row) > 3 else None,
+        "material": row[4] if len(row) > 4 else None,
+        "attribute_1": row[5] if len(row) > 5 else None,
+        "attribute_2": row[6] if len(row) > 6 else None,
+        "weight": _to_float(row[7], default=0.0) if len(row) > 7 else 0.0,
+        "location": row[8] if len(row) > 8 else None,
+        "roll_weight": _to_float(row[9]) if len(row) > 9 else None,
+        "times_logged_out": _to_int(row[10], default=0) if len(row) > 10 else 0,
+        "is_empty": str(row[11]).strip().lower() == "true" if len(row) > 11 else False,
+        "is_favorite": str(row[12]).strip().lower() == "true" if len(row) > 12 else False,
+    }
 
 
 def _inventory_records():
-    records = []
-    for row in list_inventory_rows():
-        barcode = ""
-        if row and len(row) > 1 and row[1] is not None:
-            barcode = str(row[1]).strip()
-
-        last_logged = row[0] if len(row) > 0 else None
-        records.append(
-            {
-                "last_logged": last_logged,
-                "last_logged_dt": _parse_timestamp(last_logged),
-                "barcode": barcode,
-                "brand": row[2] if len(row) > 2 else None,
-                "color": row[3] if len(row) > 3 else None,
-                "material": row[4] if len(row) > 4 else None,
-                "attribute_1": row[5] if len(row) > 5 else None,
-                "attribute_2": row[6] if len(row) > 6 else None,
-                "weight": _to_float(row[7], default=0.0) if len(row) > 7 else 0.0,
-                "location": row[8] if len(row) > 8 else None,
-                "roll_weight": _to_float(row[9]) if len(row) > 9 else None,
-                "times_logged_out": _to_int(row[10], default=0) if len(row) > 10 else 0,
-                "is_empty": str(row[11]).strip().lower() == "true" if len(row) > 11 else False,
-                "is_favorite": str(row[12]).strip().lower() == "true" if len(row) > 12 else False,
-            }
-        )
+    return [_inventory_record(row) for row in list_inventory_rows()]
 
-    return records
 
-
-def _usage_counts_since(cutoff):
-    counts = {}
-    with open_database(write=False) as conn:
-        rows = conn.execute(
-            """
-            SELECT timestamp, barcode
-            FROM usage_events
-            WHERE LOWER(COALESCE(event_type, '')) = 'log_usage'
-              AND barcode IS NOT NULL
-              AND TRIM(barcode) != ''
-            """
-        ).fetchall()
-
-    for row in rows:
-        event_timestamp = _parse_timestamp(row["timestamp"])
-        barcode = str(row["barcode"]).strip() if row["barcode"] is not None else ""
-        if not barcode or event_timestamp is None or event_timestamp < cutoff:
-            continue
-        counts[barcode] = counts.get(barcode, 0) + 1
-
-    return counts
-
-
-def _usage_cutoff_timestamp(weeks):
+def _usage_cutoff(weeks):
     if weeks is None:
         return None
-    return (datetime.now() - timedelta(weeks=weeks)).strftime("%Y-%m-%d %H:%M:%S")
-
-
-def _list_log_usage_events(weeks=None):
-    cutoff_text = _usage_cutoff_timestamp(weeks)
-    query = [
-        """
-        SELECT
-            timestamp,
-            barcode,
-            brand,
-            color,
-            material,
-            attribute_1,
-            attribute_2,
-            delta_used
-        FROM usage_events
-        WHERE LOWER(COALESCE(event_type, '')) = 'log_usage'
-        """
-    ]
-    params = []
-
-    if cutoff_text is not None:
-        query.append("AND timestamp >= ?")
-        params.append(cutoff_text)
+    return datetime.now() - timedelta(weeks=weeks)
+
 
+def _usage_cutoff_epoch(weeks):
+    cutoff = _usage_cutoff(weeks)
+    return timestamp_epoch(cutoff) if cutoff is not None else None
+
+
+_LOG_USAGE_WINDOW_SQL = """
+    event_type = 'log_usage'
+    AND ts_epoch >= ?
+    AND TRIM(barcode) != ''
+"""
+
+
+def _after_count_clauses(count_sql, rowid_sql, after):
+    # Keyset bound for ORDER BY count DESC, rowid ASC: rows past the last
+    # (count, rowid) pair already shown.
+    if after is None:
+        return [], ()
+    return (
+        [f"({count_sql} < ? OR ({count_sql} = ? AND {rowid_sql} > ?))"],
+        (after[0], after[0], after[1]),
+    )
+
+
+def _where_sql(clauses):
+    return ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+def build_popular_filaments_queries(cutoff_epoch, limit, after=None):
+    """
+    (sql, params) pairs for the windowed popular-rolls view: the ranked
+    counts, the empty-window check, and the recently-updated fallback.
+    after=(count, rowid) continues from the last row of a previous page.
+    """
+    # Only events inside the window are read (a range scan of the covering
+    # event_type/ts_epoch index); the counts are joined to inventory and ranked in the
+    # same statement. Grouping on TRIM(barcode) also keeps SQLite from walking
+    # the whole barcode index to avoid a sort. No labels are needed, so the
+    # event log is read directly rather than through the usage_events view.
+    # The LIMIT lets SQLite keep only the top rows while ranking.
+    ranked_where, ranked_params = _after_count_clauses("hits.usage_count", "inventory.rowid", after)
+    ranked = f"""
+        SELECT inventory.brand, inventory.color, inventory.material,
+               inventory.attribute_1, inventory.attribute_2,
+               inventory.filament_amount, inventory.is_favorite,
+               hits.usage_count AS times_logged_out,
+               hits.usage_count AS sort_count,
+               inventory.rowid AS sort_rowid
+        FROM (
+            SELECT TRIM(barcode) AS barcode, COUNT(*) AS usage_count
+            FROM usage_event_log
+            WHERE {_LOG_USAGE_WINDOW_SQL}
+            GROUP BY TRIM(barcode)
+        ) AS hits
+        JOIN inventory ON inventory.barcode = hits.barcode
+        {_where_sql(ranked_where)}
+        ORDER BY hits.usage_count DESC, inventory.rowid ASC
+        LIMIT ?
+    """
+    window_events = f"SELECT EXISTS(SELECT 1 FROM usage_event_log WHERE {_LOG_USAGE_WINDOW_SQL})"
+    fallback, fallback_params = _popular_inventory_query(limit, after, cutoff_epoch)
+    return {
+        "ranked": (ranked, (cutoff_epoch,) + ranked_params + (limit,)),
+        "window_events": (window_events, (cutoff_epoch,)),
+        "fallback": (fallback, fallback_params),
+    }
+
+
+def _popular_inventory_query(limit, after=None, cutoff_epoch=None):
+    # Ranked on the inventory's own times_logged_out counter: all-time
+    # popularity, or the fallback for rolls touched inside the window.
+    clauses, params = _after_count_clauses("COALESCE(times_logged_out, 0)", "rowid", after)
+    order_expr = "COALESCE(times_logged_out, 0)"
+    if cutoff_epoch is not None:
+        clauses.insert(0, "ts_epoch >= ?")
+        params = (cutoff_epoch,) + params
+        # Only the window's rolls are ranked, so read them through the
+        # ts_epoch index; the unary + keeps SQLite from walking the whole
+        # times_logged_out page index instead.
+        order_expr = f"+{order_expr}"
+    sql = f"""
+        SELECT brand, color, material, attribute_1, attribute_2,
+               filament_amount, is_favorite, times_logged_out,
+               COALESCE(times_logged_out, 0) AS sort_count,
+               rowid AS sort_rowid
+        FROM inventory
+        {_where_sql(clauses)}
+        ORDER BY {order_expr} DESC, rowid ASC
+        LIMIT ?
+    """
+    return sql, params + (limit,)
+
+
+def _popular_record(row):
+    return {
+        "brand": normalize_text_case(row["brand"], field="brand"),
+        "color": normalize_text_case(row["color"], field="color"),
+        "material": normalize_text_case(row["material"], field="material"),
+        "attribute_1": normalize_text_case(row["attribute_1"], field="attribute_1"),
+        "attribute_2": normalize_text_case(row["attribute_2"], field="attribute_2"),
+        "times_logged_out": _to_int(row["times_logged_out"], default=0),
+        "weight": _to_float(row["filament_amount"], default=0.0),
+        "is_favorite": "true" if _to_int(row["is_favorite"], default=0) else "false",
+    }
+
+
+def _popular_rows_page(source, rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_keyset_cursor(source, last["sort_count"], last["sort_rowid"])
+    return {"rows": [_popular_record(row) for row in rows], "next_cursor": next_cursor}
+
+
+def get_popular_filaments_page(limit: int = 10, weeks: int | None = None, cursor=None):
+    """
+    One page of get_most_popular_filaments: {"rows", "next_cursor"}.
+    """
+    limit = max(_to_int(limit, default=10), 0)
+    cutoff_epoch = _usage_cutoff_epoch(weeks)
+    position = decode_keyset_cursor(cursor, 3)
+    source, after = (position[0], position[1:]) if position is not None else (None, None)
+
+    # One extra row tells whether there is a next page.
     with open_database(write=False) as conn:
-        rows = conn.execute("\n".join(query), tuple(params)).fetchall()
+        if cutoff_epoch is None:
+            rows = conn.execute(*_popular_inventory_query(limit + 1, after)).fetchall()
+            return _popular_rows_page("all", rows, limit)
+
+        if source == "recent":
+            queries = build_popular_filaments_queries(cutoff_epoch, limit + 1, after)
+            rows = conn.execute(*queries["fallback"]).fetchall()
+            return _popular_rows_page("recent", rows, limit)
+
+        queries = build_popular_filaments_queries(cutoff_epoch, limit + 1, after)
+        rows = conn.execute(*queries["ranked"]).fetchall()
+        if rows or after is not None:
+            return _popular_rows_page("ranked", rows, limit)
 
-    return rows
+        if conn.execute(*queries["window_events"]).fetchone()[0]:
+            return {"rows": [], "next_cursor": None}
+
+        # No usage history in the window: fall back to rolls touched in it.
+        rows = conn.execute(*queries["fallback"]).fetchall()
+    return _popular_rows_page("recent", rows, limit)
 
 
 def get_most_popular_filaments(top_n: int = 10, weeks: int | None = None):
-    records = _inventory_records()
+    return get_popular_filaments_page(top_n, weeks)["rows"]
 
-    if weeks is not None:
-        cutoff = datetime.now() - timedelta(weeks=weeks)
-        usage_counts = _usage_counts_since(cutoff)
-
-        if usage_counts:
-            filtered = []
-            for record in records:
-                count = usage_counts.get(record["barcode"], 0)
-                if count <= 0:
-                    continue
-                updated = dict(record)
-                updated["times_logged_out"] = count
-                filtered.append(updated)
-            records = filtered
-        else:
-            records = [
-                record
-                for record in records
-                if record["last_logged_dt"] is not None and record["last_logged_dt"] >= cutoff
-            ]
-
-    records.sort(key=lambda item: item.get("times_logged_out", 0), reverse=True)
-
-    return [
-        {
-            "brand": item.get("brand"),
-            "color": item.get("color"),
-            "material": item.get("material"),
-            "attribute_1": item.get("attribute_1"),
-            "attribute_2": item.get("attribute_2"),
-            "times_logged_out": item.get("times_logged_out", 0),
-            "weight": item.get("weight"),
-            "is_favorite": "true" if item.get("is_favorite") else "false",
-        }
-        for item in records[:top_n]
-    ]
 
+def _group_sort_key(row):
+    return (-row["usage_count"], -row["used_g"], row["brand"], row["color"])
 
-def get_most_popular_groups(
-    top_n: int = 10,
+
+def _decode_group_cursor(cursor):
+    position = decode_keyset_cursor(cursor, 4)
+    if position is None:
+        return None
+    usage_count, used_g, brand, color = position
+    if not isinstance(brand, str) or not isinstance(color, str):
+        return None
+    try:
+        return (-int(usage_count), -float(used_g), brand, color)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_popular_groups_page(
+    limit: int = 10,
     weeks: int | None = None,
     group_by: str = "brand_color",
+    attribution: str = DEFAULT_ATTRIBUTION,
+    engine: str = "sql",
+    cursor=None,
 ):
+    """
+    One page of get_most_popular_groups: {"rows", "next_cursor"}.
+    """
+    limit = max(_to_int(limit, default=10), 0)
     normalized_group = str(group_by or "brand_color").strip().lower()
     if normalized_group not in ("brand", "color", "brand_color"):
         normalized_group = "brand_color"
+    after = _decode_group_cursor(cursor)
+
+    if engine == "columnar":
+        with open_database(write=False) as conn:
+            rows = usage_columns.top_groups(
+                conn,
+                limit + 1,
+                cutoff_epoch=_usage_cutoff_epoch(weeks),
+                group_by=normalized_group,
+                attribution=attribution,
+                after=after,
+            )
+    else:
+        rows = _top_group_totals(limit + 1, weeks, normalized_group, attribution, after)
 
-    grouped = {}
-    for row in _list_log_usage_events(weeks=weeks):
-        used_g = _to_float(row["delta_used"], 0.0)
-        if used_g <= 0:
-            continue
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_keyset_cursor(last["usage_count"], last["used_g"], last["brand"], last["color"])
+    return {"rows": rows, "next_cursor": next_cursor}
 
-        brand = _normalize_label(row["brand"], field="brand")
-        color = _normalize_label(row["color"], field="color")
 
-        if normalized_group == "brand":
-            key = (brand,)
-        elif normalized_group == "color":
-            key = (color,)
-        else:
-            key = (brand, color)
+_GROUP_DIMENSIONS = {
+    "brand": ("brand",),
+    "color": ("color",),
+    "brand_color": ("brand", "color"),
+}
 
-        bucket = grouped.setdefault(
-            key,
-            {
-                "brand": brand,
-                "color": color,
-                "usage_count": 0,
-                "used_g": 0.0,
-            },
+
+def _top_group_totals(top_n, weeks, group_by, attribution, after=None):
+    dimensions = _GROUP_DIMENSIONS[group_by]
+    cutoff = _usage_cutoff(weeks)
+    with open_database(write=False) as conn:
+        cells = usage_cube.query_usage_cube(
+            conn,
+            dimensions,
+            start_ts=cutoff.strftime("%Y-%m-%d %H:%M:%S") if cutoff is not None else None,
+            attribution=attribution,
         )
-        bucket["usage_count"] += 1
-        bucket["used_g"] += used_g
 
     rows = []
-    for bucket in grouped.values():
+    for key, cell in cells.items():
+        labels = dict(zip(dimensions, key))
         rows.append(
             {
-                "brand": bucket["brand"],
-                "color": bucket["color"],
-                "usage_count": int(bucket["usage_count"]),
-                "used_g": round(bucket["used_g"], 2),
+                "brand": labels.get("brand", ""),
+                "color": labels.get("color", ""),
+                "usage_count": int(cell["event_count"]),
+                "used_g": round(cell["used_g"], 2),
             }
         )
+    if after is not None:
+        rows = [row for row in rows if _group_sort_key(row) > after]
+    # Only the requested rows are kept in order; the rest are never sorted.
+    return heapq.nsmallest(top_n, rows, key=_group_sort_key)
 
-    rows.sort(key=lambda item: (-item["usage_count"], -item["used_g"], item["brand"], item["color"]))
-    return rows[:top_n]
+
+def get_most_popular_groups(
+    top_n: int = 10,
+    weeks: int | None = None,
+    group_by: str = "brand_color",
+    attribution: str = DEFAULT_ATTRIBUTION,
+    engine: str = "sql",
+):
+    return get_popular_groups_page(top_n, weeks, group_by, attribution, engine)["rows"]
 
 
 def get_low_or_empty_filaments(
@@ -246,26 +338,35 @@ def get_low_or_empty_filaments(
     return results
 
 
-def get_empty_rolls(empty_threshold: float = EMPTY_THRESHOLD):
-    records = _inventory_records()
-    empty_records = [
-        record for record in records if record["is_empty"] or record["weight"] <= empty_threshold
-    ]
-    empty_records.sort(
-        key=lambda item: item["last_logged_dt"] if item["last_logged_dt"] is not None else datetime.min,
-        reverse=True,
+def _empty_roll_record(row):
+    item = _inventory_record(row)
+    return {
+        "brand": item["brand"],
+        "color": item["color"],
+        "material": item["material"],
+        "attribute_1": item["attribute_1"],
+        "attribute_2": item["attribute_2"],
+        "times_logged_out": item["times_logged_out"],
+        "last_logged": item["last_logged"],
+        "is_favorite": "true" if item["is_favorite"] else "false",
+    }
+
+
+def get_empty_rolls_page(empty_threshold: float = EMPTY_THRESHOLD, limit: int = 200, cursor=None):
+    """
+    One page of get_empty_rolls: {"rows", "next_cursor"}.
+    """
+    limit = max(_to_int(limit, default=200), 0)
+    rows = list_empty_inventory_rows(
+        empty_threshold, limit=limit + 1, after=decode_inventory_cursor(cursor)
     )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_inventory_cursor(last[13], last[1])
+    return {"rows": [_empty_roll_record(row) for row in rows], "next_cursor": next_cursor}
 
-    return [
-        {
-            "brand": item["brand"],
-            "color": item["color"],
-            "material": item["material"],
-            "attribute_1": item["attribute_1"],
-            "attribute_2": item["attribute_2"],
-            "times_logged_out": item["times_logged_out"],
-            "last_logged": item["last_logged"],
-            "is_favorite": "true" if item["is_favorite"] else "false",
-        }
-        for item in empty_records
-    ]
+
+def get_empty_rolls(empty_threshold: float = EMPTY_THRESHOLD):
+    return [_empty_roll_record(row) for row in list_empty_inventory_rows(empty_threshold)]
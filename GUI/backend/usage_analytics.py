@@ -1,18 +1,12 @@
-from datetime import datetime
+import re
+from datetime import datetime, timedelta
 
-from backend.workbook_store import normalize_text_case, open_database
-
-
-def _to_float(value, default=0.0):
-    try:
-        return float(value)
-    except (TypeError, ValueError):
-        return default
-
-
-def _normalize_label(value, fallback="Unknown", field=None):
-    text = normalize_text_case(value, field=field)
-    return text if text else fallback
+from backend import analytics_cache, usage_columns, usage_cube
+from backend.workbook_store import (
+    DEFAULT_ATTRIBUTION,
+    get_usage_history_counter,
+    open_database,
+)
 
 
 def _sort_buckets(items, key_name):
@@ -30,96 +24,189 @@ def _sort_buckets(items, key_name):
     return rows
 
 
-def get_usage_summary(start_ts=None, end_ts=None):
+def _event_bound(conn, start_ts, end_ts, descending):
     query = [
         """
-        SELECT
-            timestamp,
-            barcode,
-            brand,
-            color,
-            material,
-            delta_used
+        SELECT timestamp
         FROM usage_events
-        WHERE LOWER(COALESCE(event_type, '')) = 'log_usage'
-          AND COALESCE(delta_used, 0) > 0
+        WHERE event_type = 'log_usage'
+          AND delta_used > 0
+          AND ts_epoch IS NOT NULL
         """
     ]
     params = []
-
     if start_ts:
-        query.append("AND timestamp >= ?")
-        params.append(str(start_ts))
+        usage_cube.append_time_bound(query, params, start_ts, ">=")
     if end_ts:
-        query.append("AND timestamp <= ?")
-        params.append(str(end_ts))
+        usage_cube.append_time_bound(query, params, end_ts, "<=")
+    query.append(f"ORDER BY ts_epoch {'DESC' if descending else 'ASC'} LIMIT 1")
+    row = conn.execute("\n".join(query), tuple(params)).fetchone()
+    return str(row["timestamp"]).strip() if row is not None else ""
 
-    query.append("ORDER BY timestamp ASC")
-    sql = "\n".join(query)
 
-    with open_database(write=False) as conn:
-        rows = conn.execute(sql, tuple(params)).fetchall()
-
-    total_used = 0.0
-    event_count = 0
-    rolls_touched = set()
-    by_material = {}
-    by_color = {}
-    by_day = {}
-    first_event = ""
-    last_event = ""
-
-    for row in rows:
-        used_g = _to_float(row["delta_used"], 0.0)
-        if used_g <= 0:
-            continue
-
-        timestamp = str(row["timestamp"] or "").strip()
-        if timestamp:
-            if not first_event:
-                first_event = timestamp
-            last_event = timestamp
-
-        total_used += used_g
-        event_count += 1
-
-        barcode = str(row["barcode"] or "").strip()
-        if barcode:
-            rolls_touched.add(barcode)
-
-        material = _normalize_label(row["material"], field="material")
-        color = _normalize_label(row["color"], field="color")
-
-        material_bucket = by_material.setdefault(material, {"used_g": 0.0, "event_count": 0})
-        material_bucket["used_g"] += used_g
-        material_bucket["event_count"] += 1
-
-        color_bucket = by_color.setdefault(color, {"used_g": 0.0, "event_count": 0})
-        color_bucket["used_g"] += used_g
-        color_bucket["event_count"] += 1
-
-        day_key = ""
-        if timestamp:
-            try:
-                day_key = datetime.strptime(timestamp[:19], "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d")
-            except ValueError:
-                day_key = timestamp[:10]
-        if day_key:
-            by_day[day_key] = by_day.get(day_key, 0.0) + used_g
+_SUMMARY_GROUP_BY = ("barcode", "material", "color", "day")
+_SUMMARY_LABELS = ("material", "color", "day")
+
+
+_DAY_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}$")
+
+
+def _sql_usage_state(conn, start_ts, end_ts, attribution, include_undated=False):
+    # One cube read gives every breakdown the summary shows; rolls are
+    # counted first, then the cells are folded to material/color/day.
+    cells = usage_cube.query_usage_cube(
+        conn,
+        _SUMMARY_GROUP_BY,
+        start_ts,
+        end_ts,
+        attribution=attribution,
+        include_undated=include_undated,
+    )
+    rolls = {key[0] for key in cells if key[0]}
+    cells = usage_cube.marginal(cells, _SUMMARY_GROUP_BY, _SUMMARY_LABELS)
+    total = usage_cube.marginal(cells, _SUMMARY_LABELS, ()).get((), {"used_g": 0.0, "event_count": 0})
 
+    def breakdown(name):
+        return {
+            key[0]: cell for key, cell in usage_cube.marginal(cells, _SUMMARY_LABELS, (name,)).items()
+        }
+
+    return {
+        "total_used": total["used_g"],
+        "event_count": total["event_count"],
+        "rolls": rolls,
+        "by_material": breakdown("material"),
+        "by_color": breakdown("color"),
+        "by_day": {day: cell["used_g"] for day, cell in breakdown("day").items() if day},
+    }
+
+
+def _closed_usage_state(conn, first_day, last_day, attribution, include_undated=False):
+    # Whole days before today only change when usage is backdated or a roll
+    # is edited, both of which bump the history counter the cache checks.
+    # Keys hold dates only, so rolling windows reuse them all day.
+    key = analytics_cache.cache_key(
+        "usage_summary", attribution, first_day or "", last_day, include_undated
+    )
+    payload = analytics_cache.get(conn, key)
+    if payload is not None:
+        payload["rolls"] = set(payload["rolls"])
+        return payload
+    # Read before computing, so history changed in between leaves the
+    # result stored under a counter that no longer matches.
+    counter = get_usage_history_counter(conn)
+    state = _sql_usage_state(
+        conn,
+        f"{first_day} 00:00:00" if first_day else None,
+        f"{last_day} 23:59:59",
+        attribution,
+        include_undated,
+    )
+    analytics_cache.put(key, dict(state, rolls=sorted(state["rolls"])), counter)
+    return state
+
+
+def _merge_usage_states(closed, live):
+    def merge_cells(left, right):
+        merged = {label: dict(cell) for label, cell in left.items()}
+        for label, cell in right.items():
+            total = merged.setdefault(label, {"used_g": 0.0, "event_count": 0})
+            total["used_g"] += cell["used_g"]
+            total["event_count"] += cell["event_count"]
+        return merged
+
+    by_day = dict(closed["by_day"])
+    for day, amount in live["by_day"].items():
+        by_day[day] = by_day.get(day, 0.0) + amount
+    return {
+        "total_used": closed["total_used"] + live["total_used"],
+        "event_count": closed["event_count"] + live["event_count"],
+        "rolls": closed["rolls"] | live["rolls"],
+        "by_material": merge_cells(closed["by_material"], live["by_material"]),
+        "by_color": merge_cells(closed["by_color"], live["by_color"]),
+        "by_day": by_day,
+    }
+
+
+def _shift_day(day, days):
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _cached_sql_usage_state(conn, start_ts, end_ts, attribution):
+    """
+    The SQL summary state, with the whole days before today served from
+    analytics_cache and partial edge days and today onwards read live.
+    """
+    start_text = str(start_ts) if start_ts else ""
+    end_text = str(end_ts) if end_ts else ""
+    if any(text and not _DAY_PATTERN.match(text[:10]) for text in (start_text, end_text)):
+        return _sql_usage_state(conn, start_ts, end_ts, attribution)
+
+    # Same edge-day split as usage_cube's rollup plan.
+    first_day = None
+    partial_start = start_text[10:] not in ("", " 00:00:00")
+    if start_text:
+        first_day = _shift_day(start_text[:10], 1) if partial_start else start_text[:10]
+    last_day = _shift_day(datetime.now().strftime("%Y-%m-%d"), -1)
+    if end_text:
+        end_day = end_text[:10] if end_text[10:] == " 23:59:59" else _shift_day(end_text[:10], -1)
+        last_day = min(last_day, end_day)
+    if first_day is not None and first_day > last_day:
+        return _sql_usage_state(conn, start_ts, end_ts, attribution)
+
+    state = _closed_usage_state(
+        conn,
+        first_day,
+        last_day,
+        attribution,
+        # All-time totals also count events without a usable timestamp.
+        include_undated=not start_text and not end_text,
+    )
+    if partial_start:
+        head = _sql_usage_state(conn, start_ts, f"{start_text[:10]} 23:59:59", attribution)
+        state = _merge_usage_states(head, state)
+    if not end_text or end_text > f"{last_day} 23:59:59":
+        tail = _sql_usage_state(conn, f"{_shift_day(last_day, 1)} 00:00:00", end_ts, attribution)
+        state = _merge_usage_states(state, tail)
+    return state
+
+
+def get_usage_summary(start_ts=None, end_ts=None, attribution=DEFAULT_ATTRIBUTION, engine="sql"):
+    """
+    Usage totals for the range. attribution picks whether material and color
+    are the roll's current attributes or those in effect at each event.
+    engine="columnar" computes the totals from usage_columns' in-memory
+    arrays instead of SQL; the SQL engine reuses cached totals for the days
+    before today.
+    """
+    with open_database(write=False) as conn:
+        state = None
+        if engine == "columnar":
+            state = usage_columns.usage_summary(conn, start_ts, end_ts, attribution)
+        if state is None:
+            state = _cached_sql_usage_state(conn, start_ts, end_ts, attribution)
+
+        if state["event_count"]:
+            first_event = _event_bound(conn, start_ts, end_ts, descending=False)
+            last_event = _event_bound(conn, start_ts, end_ts, descending=True)
+        else:
+            first_event = last_event = ""
+
+    total_used = state["total_used"]
+    event_count = state["event_count"]
     daily_usage = [
         {"date": day, "used_g": round(amount, 2)}
-        for day, amount in sorted(by_day.items(), key=lambda item: item[0])
+        for day, amount in sorted(state["by_day"].items(), key=lambda item: item[0])
     ]
 
     return {
         "total_used_g": round(total_used, 2),
         "event_count": event_count,
-        "rolls_touched": len(rolls_touched),
+        "rolls_touched": len(state["rolls"]),
         "average_per_event_g": round(total_used / event_count, 2) if event_count else 0.0,
         "first_event": first_event,
         "last_event": last_event,
-        "by_material": _sort_buckets(by_material, "material"),
-        "by_color": _sort_buckets(by_color, "color"),
+        "by_material": _sort_buckets(state["by_material"], "material"),
+        "by_color": _sort_buckets(state["by_color"], "color"),
         "daily_usage": daily_usage,
     }
@@ -0,0 +1,444 @@
+import heapq
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from backend import workbook_store
+from backend.workbook_store import (
+    ROLLUP_DAY_SQL,
+    normalize_attribution,
+    normalize_text_case,
+    timestamp_epoch,
+)
+
+_LOAD_CHUNK_SIZE = 20000
+_MISSING_EPOCH = -(2 ** 63)
+_SECONDS_PER_DAY = 86400
+_EPOCH_ORIGIN = datetime(1970, 1, 1)
+
+_LOCK = threading.Lock()
+_STATE = {"key": None, "last_id": 0}
+_COLUMNS = {}
+
+
+def _new_columns():
+    # Only positive log_usage events are kept; every report here reads
+    # nothing else.
+    return {
+        "ts_epoch": array("q"),
+        "dated": array("b"),
+        "version_id": array("q"),
+        "used_g": array("d"),
+    }
+
+
+def numpy_enabled():
+    return np is not None
+
+
+def clear_cache():
+    with _LOCK:
+        _STATE.update({"key": None, "last_id": 0})
+        _COLUMNS.clear()
+
+
+def _database_key():
+    path = os.path.abspath(workbook_store.DATABASE_PATH)
+    try:
+        inode = os.stat(path).st_ino
+    except OSError:
+        inode = None
+    return (path, inode)
+
+
+def _refresh(conn):
+    key = _database_key()
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM usage_event_log").fetchone()[0]
+    if _STATE["key"] != key or max_id < _STATE["last_id"]:
+        _STATE.update({"key": key, "last_id": 0})
+        _COLUMNS.clear()
+        _COLUMNS.update(_new_columns())
+    if max_id == _STATE["last_id"]:
+        return 0
+
+    # Events are append-only, so only rows past the last loaded id are read.
+    # The unary + keeps SQLite on the rowid range (already in id order)
+    # instead of the event_type index, which would need a sort. SQLite fills
+    # in the defaults so each chunk can be transposed straight into the
+    # typed arrays.
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"""
+        SELECT
+            COALESCE(ts_epoch, ?),
+            ts_epoch IS NOT NULL AND ({ROLLUP_DAY_SQL}) != '',
+            COALESCE(version_id, 0),
+            delta_used
+        FROM usage_event_log
+        WHERE id > ? AND id <= ?
+          AND +event_type = 'log_usage'
+          AND delta_used > 0
+        ORDER BY id
+        """,
+        (_MISSING_EPOCH, _STATE["last_id"], max_id),
+    )
+    loaded = 0
+    while True:
+        rows = cursor.fetchmany(_LOAD_CHUNK_SIZE)
+        if not rows:
+            break
+        for name, values in zip(("ts_epoch", "dated", "version_id", "used_g"), zip(*rows)):
+            _COLUMNS[name].extend(values)
+        loaded += len(rows)
+    _STATE["last_id"] = max_id
+    return loaded
+
+
+def refresh(conn=None):
+    """
+    Load events added since the last refresh. Returns how many were loaded.
+    """
+    if conn is None:
+        with workbook_store.open_database(write=False) as read_conn:
+            return refresh(read_conn)
+    with _LOCK:
+        return _refresh(conn)
+
+
+def _normalize_label(value, field):
+    text = normalize_text_case(value, field=field)
+    return text if text else "Unknown"
+
+
+class _Categories:
+    """
+    Dictionary encoding: each distinct label gets a small integer code.
+    """
+
+    def __init__(self, first=None):
+        self.labels = []
+        self.codes = {}
+        if first is not None:
+            self.code(first)
+
+    def code(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            code = len(self.labels)
+            self.codes[label] = code
+            self.labels.append(label)
+        return code
+
+    def ranks(self):
+        order = sorted(range(len(self.labels)), key=lambda code: self.labels[code])
+        ranks = [0] * len(self.labels)
+        for rank, code in enumerate(order):
+            ranks[code] = rank
+        return ranks
+
+
+def _version_categories(conn, attribution):
+    """
+    Per roll version id, the codes of the brand, color, and material labels
+    the attribution assigns to its events, and of its barcode ('' is code 0).
+    """
+    dimensions = {row[0]: row[1] for row in conn.execute("SELECT id, value FROM catalog_dimensions")}
+    versions = conn.execute("SELECT id, barcode, brand_id, color_id, material_id FROM roll_versions").fetchall()
+    by_id = {row[0]: row for row in versions}
+    current = {}
+    if normalize_attribution(attribution) == "current":
+        current = {
+            row[0]: row[1]
+            for row in conn.execute("SELECT barcode, version_id FROM inventory WHERE version_id IS NOT NULL")
+        }
+
+    size = max(by_id, default=0) + 1
+    categories = {
+        "brand": _Categories("Unknown"),
+        "color": _Categories("Unknown"),
+        "material": _Categories("Unknown"),
+        "barcode": _Categories(""),
+    }
+    codes = {field: [0] * size for field in categories}
+    label_codes = {}
+    for version_id, row in by_id.items():
+        label_row = by_id.get(current.get(row[1]), row)
+        key = (label_row[2], label_row[3], label_row[4])
+        cached = label_codes.get(key)
+        if cached is None:
+            cached = label_codes[key] = tuple(
+                categories[field].code(_normalize_label(dimensions.get(dimension_id), field))
+                for field, dimension_id in zip(("brand", "color", "material"), key)
+            )
+        codes["brand"][version_id], codes["color"][version_id], codes["material"][version_id] = cached
+        codes["barcode"][version_id] = categories["barcode"].code(str(row[1] or "").strip())
+    return codes, categories
+
+
+def _day_label(day_number):
+    return (_EPOCH_ORIGIN + timedelta(days=int(day_number))).strftime("%Y-%m-%d")
+
+
+def _summary_bounds(start_ts, end_ts):
+    bounds = []
+    for value in (start_ts, end_ts):
+        if not value:
+            bounds.append(None)
+            continue
+        epoch = timestamp_epoch(value)
+        if epoch is None:
+            return None
+        bounds.append(epoch)
+    return bounds
+
+
+def _column(name, dtype):
+    column = _COLUMNS[name]
+    if not len(column):
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(column, dtype=dtype)
+
+
+def _summary_numpy(start_epoch, end_epoch, codes, categories):
+    ts_epoch = _column("ts_epoch", np.int64)
+    dated = _column("dated", np.int8).astype(bool)
+    version_id = _column("version_id", np.int64)
+    used_g = _column("used_g", np.float64)
+
+    if start_epoch is not None or end_epoch is not None:
+        # Bounded windows only count events with a full timestamp, the same
+        # events the usage_daily rollup assigns to a day.
+        mask = dated.copy()
+        if start_epoch is not None:
+            mask &= ts_epoch >= start_epoch
+        if end_epoch is not None:
+            mask &= ts_epoch <= end_epoch
+        ts_epoch, dated, version_id, used_g = ts_epoch[mask], dated[mask], version_id[mask], used_g[mask]
+
+    state = {
+        "total_used": float(used_g.sum()),
+        "event_count": int(used_g.size),
+        "rolls": set(),
+        "by_material": {},
+        "by_color": {},
+        "by_day": {},
+    }
+    for field, key_name in (("material", "by_material"), ("color", "by_color")):
+        field_codes = np.asarray(codes[field], dtype=np.int64)[version_id]
+        size = len(categories[field].labels)
+        counts = np.bincount(field_codes, minlength=size)
+        used = np.bincount(field_codes, weights=used_g, minlength=size)
+        for code in np.flatnonzero(counts):
+            state[key_name][categories[field].labels[code]] = {
+                "used_g": float(used[code]),
+                "event_count": int(counts[code]),
+            }
+
+    barcode_codes = np.unique(np.asarray(codes["barcode"], dtype=np.int64)[version_id])
+    state["rolls"] = {categories["barcode"].labels[code] for code in barcode_codes if code}
+
+    days, day_index = np.unique(ts_epoch[dated] // _SECONDS_PER_DAY, return_inverse=True)
+    day_used = np.bincount(day_index, weights=used_g[dated], minlength=days.size)
+    for day_number, used in zip(days, day_used):
+        state["by_day"][_day_label(day_number)] = float(used)
+    return state
+
+
+def _summary_python(start_epoch, end_epoch, codes, categories):
+    bounded = start_epoch is not None or end_epoch is not None
+    low = _MISSING_EPOCH if start_epoch is None else start_epoch
+    high = 2 ** 63 - 1 if end_epoch is None else end_epoch
+
+    material_counts = {}
+    color_counts = {}
+    day_used = {}
+    barcodes = set()
+    total_used = 0.0
+    event_count = 0
+    for ts_epoch, dated, version_id, used_g in zip(
+        _COLUMNS["ts_epoch"], _COLUMNS["dated"], _COLUMNS["version_id"], _COLUMNS["used_g"]
+    ):
+        if bounded and not (dated and low <= ts_epoch <= high):
+            continue
+        total_used += used_g
+        event_count += 1
+        for field_counts, field in ((material_counts, "material"), (color_counts, "color")):
+            bucket = field_counts.setdefault(codes[field][version_id], [0.0, 0])
+            bucket[0] += used_g
+            bucket[1] += 1
+        barcodes.add(codes["barcode"][version_id])
+        if dated:
+            day_number = ts_epoch // _SECONDS_PER_DAY
+            day_used[day_number] = day_used.get(day_number, 0.0) + used_g
+
+    state = {
+        "total_used": total_used,
+        "event_count": event_count,
+        "rolls": {categories["barcode"].labels[code] for code in barcodes if code},
+        "by_material": {},
+        "by_color": {},
+        "by_day": {_day_label(day_number): used for day_number, used in day_used.items()},
+    }
+    for field_counts, field, key_name in (
+        (material_counts, "material", "by_material"),
+        (color_counts, "color", "by_color"),
+    ):
+        for code, (used, count) in field_counts.items():
+            state[key_name][categories[field].labels[code]] = {"used_g": used, "event_count": count}
+    return state
+
+
+def usage_summary(conn, start_ts=None, end_ts=None, attribution=workbook_store.DEFAULT_ATTRIBUTION):
+    """
+    Usage totals in the usage_analytics state shape (total_used,
+    event_count, rolls, by_material, by_color, by_day), or None when a
+    bound is not a plain date or timestamp.
+    """
+    bounds = _summary_bounds(start_ts, end_ts)
+    if bounds is None:
+        return None
+
+    with _LOCK:
+        _refresh(conn)
+        codes, categories = _version_categories(conn, attribution)
+        if np is not None:
+            return _summary_numpy(bounds[0], bounds[1], codes, categories)
+        return _summary_python(bounds[0], bounds[1], codes, categories)
+
+
+def _group_rows(brand_labels, color_labels, counts, used):
+    return [
+        {
+            "brand": brand,
+            "color": color,
+            "usage_count": int(count),
+            "used_g": round(float(used_g), 2),
+        }
+        for brand, color, count, used_g in zip(brand_labels, color_labels, counts, used)
+    ]
+
+
+def _group_labels(categories, field, group_by):
+    # Only the grouped fields are labelled; the other one is left blank, as
+    # in the SQL engine.
+    labels = categories[field].labels
+    if group_by not in (field, "brand_color"):
+        return [""] * len(labels), [0] * len(labels)
+    return labels, categories[field].ranks()
+
+
+def _top_groups_numpy(top_n, cutoff_epoch, group_by, codes, categories, after=None):
+    version_id = _column("version_id", np.int64)
+    used_g = _column("used_g", np.float64)
+    if cutoff_epoch is not None:
+        mask = _column("ts_epoch", np.int64) >= cutoff_epoch
+        version_id, used_g = version_id[mask], used_g[mask]
+    if not version_id.size or top_n <= 0:
+        return []
+
+    brand = np.asarray(codes["brand"], dtype=np.int64)[version_id]
+    color = np.asarray(codes["color"], dtype=np.int64)[version_id]
+    if group_by == "brand":
+        keys = brand
+    elif group_by == "color":
+        keys = color
+    else:
+        keys = brand * len(categories["color"].labels) + color
+
+    _, first_index, group_index = np.unique(keys, return_index=True, return_inverse=True)
+    counts = np.bincount(group_index)
+    used = np.round(np.bincount(group_index, weights=used_g), 2)
+    group_brand = brand[first_index]
+    group_color = color[first_index]
+    brand_labels, brand_ranks = _group_labels(categories, "brand", group_by)
+    color_labels, color_ranks = _group_labels(categories, "color", group_by)
+
+    candidates = np.arange(counts.size)
+    if after is not None:
+        after_count, after_used = -after[0], -after[1]
+        keep = (counts < after_count) | ((counts == after_count) & (used < after_used))
+        for index in np.flatnonzero((counts == after_count) & (used == after_used)):
+            labels = (brand_labels[group_brand[index]], color_labels[group_color[index]])
+            keep[index] = labels > after[2:]
+        candidates = np.flatnonzero(keep)
+    if top_n < candidates.size:
+        # Every top-N group has at least the N-th largest count, so only
+        # those groups (ties included) go through the full sort.
+        kth = candidates.size - top_n
+        threshold = np.partition(counts[candidates], kth)[kth]
+        candidates = candidates[counts[candidates] >= threshold]
+
+    brand_ranks = np.asarray(brand_ranks, dtype=np.int64)[group_brand[candidates]]
+    color_ranks = np.asarray(color_ranks, dtype=np.int64)[group_color[candidates]]
+    order = candidates[
+        np.lexsort((color_ranks, brand_ranks, -used[candidates], -counts[candidates]))[:top_n]
+    ]
+    return _group_rows(
+        [brand_labels[code] for code in group_brand[order]],
+        [color_labels[code] for code in group_color[order]],
+        counts[order],
+        used[order],
+    )
+
+
+def _top_groups_python(top_n, cutoff_epoch, group_by, codes, categories, after=None):
+    grouped = {}
+    for ts_epoch, version_id, used_g in zip(_COLUMNS["ts_epoch"], _COLUMNS["version_id"], _COLUMNS["used_g"]):
+        if cutoff_epoch is not None and ts_epoch < cutoff_epoch:
+            continue
+        brand = codes["brand"][version_id]
+        color = codes["color"][version_id]
+        if group_by == "brand":
+            key = brand
+        elif group_by == "color":
+            key = color
+        else:
+            key = (brand, color)
+        bucket = grouped.setdefault(key, [brand, color, 0, 0.0])
+        bucket[2] += 1
+        bucket[3] += used_g
+
+    brand_labels, _ = _group_labels(categories, "brand", group_by)
+    color_labels, _ = _group_labels(categories, "color", group_by)
+
+    def sort_key(item):
+        return (-item[2], -round(item[3], 2), brand_labels[item[0]], color_labels[item[1]])
+
+    buckets = grouped.values()
+    if after is not None:
+        buckets = (item for item in buckets if sort_key(item) > after)
+    buckets = heapq.nsmallest(max(top_n, 0), buckets, key=sort_key)
+    return _group_rows(
+        [brand_labels[item[0]] for item in buckets],
+        [color_labels[item[1]] for item in buckets],
+        [item[2] for item in buckets],
+        [item[3] for item in buckets],
+    )
+
+
+def top_groups(
+    conn,
+    top_n,
+    cutoff_epoch=None,
+    group_by="brand_color",
+    attribution=workbook_store.DEFAULT_ATTRIBUTION,
+    after=None,
+):
+    """
+    The get_most_popular_groups rows computed from the in-memory columns.
+    after is the (-usage_count, -used_g, brand, color) key of the last row
+    of a previous page.
+    """
+    with _LOCK:
+        _refresh(conn)
+        codes, categories = _version_categories(conn, attribution)
+        if np is not None:
+            return _top_groups_numpy(top_n, cutoff_epoch, group_by, codes, categories, after)
+        return _top_groups_python(top_n, cutoff_epoch, group_by, codes, categories, after)
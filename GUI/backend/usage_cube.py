@@ -0,0 +1,329 @@
+import re
+from datetime import date, datetime, timedelta
+
+from backend.workbook_store import (
+    DEFAULT_ATTRIBUTION,
+    ROLLUP_DAY_SQL,
+    normalize_text_case,
+    roll_label_joins,
+    timestamp_epoch,
+)
+
+# Every cube cell is one (day, roll version) pair from the usage_daily rollup,
+# so any of these roll details can be grouped or filtered on without
+# touching the event log.
+CUBE_DIMENSIONS = ("barcode", "brand", "color", "material", "attribute_1", "attribute_2", "location")
+CUBE_PERIODS = ("day", "week", "month")
+
+_LABEL_COLUMNS = CUBE_DIMENSIONS[1:]
+_BLANK_LABEL_DIMENSIONS = ("barcode", "attribute_1", "attribute_2")
+_DAY_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}$")
+
+
+def normalize_group_by(group_by):
+    """
+    The valid cube dimensions and periods in group_by, in order, with at
+    most one period.
+    """
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    names = []
+    for name in group_by or ():
+        text = str(name or "").strip().lower()
+        if text in names:
+            continue
+        if text in CUBE_PERIODS and any(existing in CUBE_PERIODS for existing in names):
+            continue
+        if text in CUBE_DIMENSIONS or text in CUBE_PERIODS:
+            names.append(text)
+    return tuple(names)
+
+
+def append_time_bound(query, params, value, operator):
+    # Bounds that parse as timestamps compare on the indexed ts_epoch column;
+    # anything else falls back to comparing the stored text.
+    epoch = timestamp_epoch(value)
+    if epoch is not None:
+        query.append(f"AND ts_epoch {operator} ?")
+        params.append(epoch)
+    else:
+        query.append(f"AND timestamp {operator} ?")
+        params.append(str(value))
+
+
+def _day_bounds_sql(first_day, last_day, include_undated=False):
+    clauses = []
+    params = []
+    if first_day is not None:
+        clauses.append("day >= ?")
+        params.append(first_day)
+    elif last_day is not None and not include_undated:
+        # The '' day holds events without a usable timestamp; only
+        # all-time totals include it.
+        clauses.append("day > ''")
+    if last_day is not None:
+        clauses.append("day <= ?")
+        params.append(last_day)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", tuple(params)
+
+
+def build_cube_rollup_query(first_day=None, last_day=None, include_undated=False):
+    """
+    (day, version_id, used_g, event_count) cells for whole days, read from
+    the usage_daily rollup. include_undated keeps the '' day under an end
+    bound.
+    """
+    where_sql, params = _day_bounds_sql(first_day, last_day, include_undated)
+    sql = f"""
+        SELECT day, version_id, used_g, event_count
+        FROM usage_daily
+        {where_sql}
+    """
+    return sql, params
+
+
+def build_cube_events_query(start_ts=None, end_ts=None, before_ts=None, rollup_days_only=False):
+    """
+    The same cells for a partial day (or a range with unusual bounds),
+    summed from the event log.
+    """
+    query = [
+        """
+        SELECT
+            COALESCE(date(ts_epoch, 'unixepoch'), SUBSTR(TRIM(timestamp), 1, 10)) AS day,
+            version_id,
+            SUM(delta_used) AS used_g,
+            COUNT(*) AS event_count
+        FROM usage_event_log
+        WHERE event_type = 'log_usage'
+          AND delta_used > 0
+        """
+    ]
+    params = []
+    if start_ts:
+        append_time_bound(query, params, start_ts, ">=")
+    if end_ts:
+        append_time_bound(query, params, end_ts, "<=")
+    if before_ts:
+        append_time_bound(query, params, before_ts, "<")
+    if rollup_days_only:
+        # Events without a rollup day are already counted under its '' day.
+        query.append(f"AND ({ROLLUP_DAY_SQL}) != ''")
+    query.append("GROUP BY version_id, day")
+    return "\n".join(query), tuple(params)
+
+
+def build_version_labels_query(attribution=DEFAULT_ATTRIBUTION, columns=None):
+    """
+    (version_id, barcode, *columns) for every roll version: the labels its
+    cells are grouped under. columns defaults to every label column.
+    """
+    if columns is None:
+        columns = _LABEL_COLUMNS
+    columns = tuple(column for column in _LABEL_COLUMNS if column in columns)
+    label_sql = "".join(f",\n            {column}_dim.value AS {column}" for column in columns)
+    sql = f"""
+        SELECT
+            versions.id AS version_id,
+            label_version.barcode AS barcode{label_sql}
+        FROM roll_versions AS versions
+        {roll_label_joins("versions.id", attribution, columns)}
+    """
+    return sql, ()
+
+
+def _shift_day(day_text, days):
+    return (datetime.strptime(day_text, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _rollup_plan(start_ts, end_ts):
+    """
+    Split the requested range into whole days read from usage_daily and
+    partial edge days read from the event log. Returns None when a bound is
+    not a plain date or timestamp, in which case every event is read live.
+    """
+    start_text = str(start_ts) if start_ts else ""
+    end_text = str(end_ts) if end_ts else ""
+    for text in (start_text, end_text):
+        if text and not _DAY_PATTERN.match(text[:10]):
+            return None
+
+    first_day = None
+    live_windows = []
+    if start_text:
+        first_day = start_text[:10]
+        if start_text[10:] not in ("", " 00:00:00"):
+            first_day = _shift_day(first_day, 1)
+            live_windows.append((start_text, end_text or None, first_day))
+
+    last_day = None
+    if end_text:
+        last_day = end_text[:10]
+        if end_text[10:] != " 23:59:59":
+            last_day = _shift_day(last_day, -1)
+            if not start_text or end_text[:10] != start_text[:10]:
+                live_windows.append((max(start_text, end_text[:10]), end_text, None))
+            elif not live_windows:
+                live_windows.append((start_text, end_text, None))
+
+    if first_day is not None and last_day is not None and first_day > last_day:
+        first_day = last_day = None
+        use_rollup = False
+    else:
+        use_rollup = True
+    return {
+        "use_rollup": use_rollup,
+        "first_day": first_day,
+        "last_day": last_day,
+        "live_windows": live_windows,
+    }
+
+
+def _cube_sources(start_ts, end_ts, include_undated=False):
+    plan = _rollup_plan(start_ts, end_ts)
+    if plan is None:
+        return [build_cube_events_query(start_ts, end_ts)]
+    sources = []
+    if plan["use_rollup"]:
+        sources.append(
+            build_cube_rollup_query(plan["first_day"], plan["last_day"], include_undated)
+        )
+    for window_start, window_end, window_before in plan["live_windows"]:
+        sources.append(
+            build_cube_events_query(
+                window_start,
+                window_end,
+                window_before,
+                rollup_days_only=True,
+            )
+        )
+    return sources
+
+
+def _period_key(day, period, cache):
+    key = cache.get((period, day))
+    if key is None:
+        key = day or ""
+        if key and period != "day":
+            try:
+                parsed = date.fromisoformat(key)
+            except ValueError:
+                parsed = None
+            if parsed is not None and period == "week":
+                key = (parsed - timedelta(days=parsed.weekday())).isoformat()
+            elif parsed is not None:
+                key = key[:7]
+        cache[(period, day)] = key
+    return key
+
+
+def _label(name, raw):
+    if name == "barcode":
+        label = str(raw or "").strip()
+    else:
+        label = normalize_text_case(raw, field=name) or ""
+    if not label and name not in _BLANK_LABEL_DIMENSIONS:
+        label = "Unknown"
+    return label
+
+
+def _filter_sets(filters):
+    sets = {}
+    for name, value in (filters or {}).items():
+        if name not in CUBE_DIMENSIONS:
+            continue
+        values = [value] if isinstance(value, str) or value is None else list(value)
+        sets[name] = {str(item or "").strip().lower() for item in values}
+    return sets
+
+
+def _labels_key(raw, fields, group_by, filter_sets):
+    # The group_by labels for one roll version's raw label values, or None
+    # when a filter excludes it. The period slot, if any, is filled in per cell.
+    labels = {name: _label(name, value) for name, value in zip(fields, raw)}
+    if any(labels[name].lower() not in allowed for name, allowed in filter_sets.items()):
+        return None
+    return tuple(labels.get(name, "") for name in group_by)
+
+
+def _version_keys(conn, fields, group_by, filter_sets, attribution):
+    columns = tuple(name for name in fields if name != "barcode")
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    keys = {}
+    raw_keys = {}
+    for row in cursor.execute(*build_version_labels_query(attribution, columns)):
+        raw = row[1:] if "barcode" in fields else row[2:]
+        if raw not in raw_keys:
+            raw_keys[raw] = _labels_key(raw, fields, group_by, filter_sets)
+        keys[row[0]] = raw_keys[raw]
+    return keys
+
+
+def query_usage_cube(
+    conn,
+    group_by=(),
+    start_ts=None,
+    end_ts=None,
+    filters=None,
+    attribution=DEFAULT_ATTRIBUTION,
+    include_undated=False,
+):
+    """
+    Positive log_usage totals for the range grouped by any mix of
+    CUBE_DIMENSIONS and one of CUBE_PERIODS ("week" keys are the Monday,
+    "month" keys are YYYY-MM). filters maps a dimension to a label or a list
+    of labels to keep (case-insensitive). include_undated counts events
+    without a usable timestamp under an end bound, as all-time totals do.
+    Returns
+    {key tuple: {"used_g", "event_count"}} in group_by order.
+    """
+    group_by = normalize_group_by(group_by)
+    filter_sets = _filter_sets(filters)
+    fields = tuple(name for name in CUBE_DIMENSIONS if name in group_by or name in filter_sets)
+    period = next((name for name in group_by if name in CUBE_PERIODS), None)
+    period_index = group_by.index(period) if period else None
+
+    # Cells only carry a roll version id; its labels are looked up and
+    # normalized once per version rather than once per cell.
+    version_keys = _version_keys(conn, fields, group_by, filter_sets, attribution)
+    # Cells without a known roll version get the blank labels.
+    missing_key = _labels_key((None,) * len(fields), fields, group_by, filter_sets)
+    period_cache = {}
+    cells = {}
+    for sql, params in _cube_sources(start_ts, end_ts, include_undated):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        for day, version_id, used_g, event_count in cursor.execute(sql, params):
+            key = version_keys.get(version_id, missing_key)
+            if key is None:
+                continue
+            if period is not None:
+                key = (
+                    key[:period_index]
+                    + (_period_key(day, period, period_cache),)
+                    + key[period_index + 1 :]
+                )
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = {"used_g": 0.0, "event_count": 0}
+            cell["used_g"] += used_g or 0.0
+            cell["event_count"] += event_count or 0
+    return cells
+
+
+def marginal(cells, group_by, keep):
+    """
+    Re-total query_usage_cube cells over a subset of their group_by names.
+    """
+    group_by = normalize_group_by(group_by)
+    positions = [group_by.index(name) for name in normalize_group_by(keep) if name in group_by]
+    totals = {}
+    for key, cell in cells.items():
+        sub_key = tuple(key[position] for position in positions)
+        total = totals.get(sub_key)
+        if total is None:
+            total = totals[sub_key] = {"used_g": 0.0, "event_count": 0}
+        total["used_g"] += cell["used_g"]
+        total["event_count"] += cell["event_count"]
+    return totals
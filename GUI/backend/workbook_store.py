@@ -1,11 +1,17 @@
+import base64
+import hashlib
 import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
-from backend import catalog_normalization
-from backend.config import DATABASE_PATH, DATA_DIR, EXCEL_PATH
+from backend import catalog_normalization, catalog_registry, color_search
+from backend.config import DATABASE_PATH, EXCEL_PATH, SETTINGS_PATH
 
 
 def _to_bool(value, default=False):
@@ -46,8 +52,88 @@ def _normalize_timestamp(value):
     return text or None
 
 
-_MAPPING_LOOKUP_CACHE = {}
-_CANONICALIZATION_SCHEMA_VERSION = 2
+_EPOCH_ORIGIN = datetime(1970, 1, 1)
+_EPOCH_TEXT_PATTERN = re.compile(
+    r"([0-9]{4})-([0-9]{2})-([0-9]{2})(?: ([0-9]{2}):([0-9]{2}):([0-9]{2}))?"
+)
+
+
+def timestamp_epoch(value):
+    """
+    Integer seconds since 1970-01-01 for a stored "YYYY-MM-DD HH:MM:SS" or
+    "YYYY-MM-DD" timestamp, read as wall-clock time (no time zone is applied,
+    so the day is ts_epoch // 86400). None for anything else.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int((value.replace(tzinfo=None) - _EPOCH_ORIGIN) // timedelta(seconds=1))
+    match = _EPOCH_TEXT_PATTERN.fullmatch(str(value).strip())
+    if match is None:
+        return None
+    try:
+        parsed = datetime(*(int(part) if part else 0 for part in match.groups()))
+    except ValueError:
+        return None
+    return int((parsed - _EPOCH_ORIGIN) // timedelta(seconds=1))
+
+
+CANONICALIZATION_CACHE_SIZE = 4096
+_CANONICALIZATION_CHECK_INTERVAL_SEC = 2.0
+_CANONICALIZATION_LOCK = threading.Lock()
+_CANONICALIZATION_CACHE = {}
+_CANONICALIZATION_STATS = {}
+_CANONICALIZATION_STATE = {"signature": None, "checked_at": None}
+_CANONICALIZATION_SCHEMA_VERSION = 4
+_EVENT_TYPE_SCHEMA_VERSION = 8
+_TS_EPOCH_SCHEMA_VERSION = 10
+_ROLL_VERSION_SCHEMA_VERSION = 12
+_SCHEMA_VERSION = 13
+_TS_EPOCH_BACKFILL_CHUNK_SIZE = 5000
+_LEGACY_IMPORT_META_KEY = "legacy_import"
+_COLOR_TOKENS_META_KEY = "inventory_fts_color_tokens"
+_BARCODE_SEQUENCE_NAME = "inventory"
+BARCODE_SERIAL_MAX = 99999
+
+DEFAULT_STORAGE_PROFILE = "balanced"
+STORAGE_PROFILES = {
+    # Rollback journal with full fsync: the original SQLite defaults.
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 30000,
+    },
+    # WAL lets dashboard reads proceed while a scan is being committed.
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+    # No fsync: the last commits can be lost on power failure or OS crash.
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+}
+_STORAGE_PROFILE_CACHE = {"signature": None, "name": DEFAULT_STORAGE_PROFILE}
+
+_POOL_MAX_IDLE_CONNECTIONS = 8
+_POOL_LOCK = threading.Lock()
+_POOL = {"key": None, "idle": [], "schema_ready": False, "fts": False}
+# Catalog file signature the color tokens were last synced against, and when
+# the files were last checked for edits.
+_SEARCH_SYNC_STATE = {"signature": None, "checked_at": None}
+_THREAD_STATE = threading.local()
 
 
 def _normalize_space(value):
@@ -58,48 +144,50 @@ def _lookup_key(value):
     return catalog_normalization.lookup_key(value)
 
 
-def _load_mapping(filename):
-    path = os.path.join(DATA_DIR, filename)
-    try:
-        with open(path, "r", encoding="utf-8") as handle:
-            payload = json.load(handle)
-    except Exception:
-        return {}
-    return payload if isinstance(payload, dict) else {}
+def _mapping_lookup(mapping_name):
+    return catalog_registry.get_label_lookup(mapping_name)
 
 
-def _flatten_color_mapping(color_mapping):
-    flattened = {}
-    if not isinstance(color_mapping, dict):
-        return flattened
-    for key_name, value in color_mapping.items():
-        if isinstance(value, dict):
-            for code, label in value.items():
-                flattened[code] = label
-        else:
-            flattened[key_name] = value
-    return flattened
+def clear_canonicalization_cache():
+    with _CANONICALIZATION_LOCK:
+        _CANONICALIZATION_CACHE.clear()
+        _CANONICALIZATION_STATS.clear()
+        _CANONICALIZATION_STATE["signature"] = None
+        _CANONICALIZATION_STATE["checked_at"] = None
 
 
-def _mapping_lookup(mapping_name):
-    if mapping_name in _MAPPING_LOOKUP_CACHE:
-        return _MAPPING_LOOKUP_CACHE[mapping_name]
-
-    if mapping_name == "brand":
-        raw = _load_mapping("brand_mapping.json")
-    elif mapping_name == "color":
-        raw = _flatten_color_mapping(_load_mapping("color_mapping.json"))
-    elif mapping_name == "material":
-        raw = _load_mapping("material_mapping.json")
-    elif mapping_name == "attribute":
-        raw = _load_mapping("attribute_mapping.json")
-    else:
-        raw = {}
+def _refresh_canonicalization_cache():
+    # Stat the mapping/alias files at most once per interval; a changed file
+    # drops every canonical value derived from the old contents.
+    now = time.monotonic()
+    checked_at = _CANONICALIZATION_STATE["checked_at"]
+    if checked_at is not None and now - checked_at < _CANONICALIZATION_CHECK_INTERVAL_SEC:
+        return
 
-    lookup = catalog_normalization.build_label_lookup(mapping_name, raw)
+    signature = catalog_registry.catalog_signature()
+    with _CANONICALIZATION_LOCK:
+        previous = _CANONICALIZATION_STATE["signature"]
+        if previous is not None and previous != signature:
+            _CANONICALIZATION_CACHE.clear()
+        _CANONICALIZATION_STATE["signature"] = signature
+        _CANONICALIZATION_STATE["checked_at"] = now
 
-    _MAPPING_LOOKUP_CACHE[mapping_name] = lookup
-    return lookup
+
+def get_canonicalization_stats():
+    """
+    Per-field cache counters for normalize_text_case: hits, misses,
+    evictions, current size, and hit rate.
+    """
+    with _CANONICALIZATION_LOCK:
+        stats = {}
+        for field_name, counters in _CANONICALIZATION_STATS.items():
+            lookups = counters["hits"] + counters["misses"]
+            stats[field_name] = {
+                **counters,
+                "size": len(_CANONICALIZATION_CACHE.get(field_name, ())),
+                "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
+        return stats
 
 
 def _canonicalize_mapped_text(value, mapping_name):
@@ -115,35 +203,80 @@ def _canonicalize_mapped_text(value, mapping_name):
     return text
 
 
-def normalize_text_case(value, field=None):
-    if value is None:
-        return None
+def _canonicalize_location(text):
+    lowered = text.lower()
+    if lowered == "lab":
+        return "Lab"
+    if lowered == "storage":
+        return "Storage"
+    return text
 
-    text = _normalize_space(value)
-    if not text:
-        return ""
 
+def _canonicalize_field(text, field_key):
+    if field_key in catalog_registry.MAPPING_FILENAMES:
+        return _canonicalize_mapped_text(text, field_key)
+    if field_key == "location":
+        return _canonicalize_location(text)
+    return text
+
+
+def _cache_field_key(field):
     field_key = str(field or "").strip().lower()
-    if field_key == "brand":
-        return _canonicalize_mapped_text(text, "brand")
-    if field_key == "color":
-        return _canonicalize_mapped_text(text, "color")
-    if field_key == "material":
-        return _canonicalize_mapped_text(text, "material")
     if field_key in ("attribute", "attribute_1", "attribute_2"):
-        return _canonicalize_mapped_text(text, "attribute")
-    if field_key == "location":
-        lowered = text.lower()
-        if lowered == "lab":
-            return "Lab"
-        if lowered == "storage":
-            return "Storage"
-        return text
+        return "attribute"
+    if field_key in ("brand", "color", "material", "location"):
+        return field_key
+    return None
 
-    return text
 
+def normalize_event_type(value):
+    if value is None:
+        return None
+    return str(value).strip().lower()
+
+
+def normalize_text_case(value, field=None):
+    if value is None:
+        return None
+
+    field_key = _cache_field_key(field)
+    if field_key is None or not isinstance(value, str):
+        text = _normalize_space(value)
+        if not text or field_key is None:
+            return text
+        return _canonicalize_field(text, field_key)
+
+    _refresh_canonicalization_cache()
+    with _CANONICALIZATION_LOCK:
+        cache = _CANONICALIZATION_CACHE.get(field_key)
+        if cache is None:
+            cache = _CANONICALIZATION_CACHE[field_key] = OrderedDict()
+        counters = _CANONICALIZATION_STATS.get(field_key)
+        if counters is None:
+            counters = _CANONICALIZATION_STATS[field_key] = {"hits": 0, "misses": 0, "evictions": 0}
+        canonical = cache.get(value)
+        if canonical is not None:
+            cache.move_to_end(value)
+            counters["hits"] += 1
+            return canonical
+        counters["misses"] += 1
 
-def _canonicalize_existing_catalog_values(conn):
+    text = _normalize_space(value)
+    canonical = _canonicalize_field(text, field_key) if text else ""
+
+    with _CANONICALIZATION_LOCK:
+        cache = _CANONICALIZATION_CACHE.setdefault(field_key, OrderedDict())
+        cache[value] = canonical
+        if len(cache) > CANONICALIZATION_CACHE_SIZE:
+            cache.popitem(last=False)
+            counters = _CANONICALIZATION_STATS.setdefault(
+                field_key, {"hits": 0, "misses": 0, "evictions": 0}
+            )
+            counters["evictions"] += 1
+    return canonical
+
+
+def _canonicalize_existing_catalog_values(conn, include_events=True):
     migration_specs = (
         ("inventory", "brand", "brand"),
         ("inventory", "color", "color"),
@@ -160,6 +293,8 @@ def _canonicalize_existing_catalog_values(conn):
     )
 
     for table_name, column_name, field_name in migration_specs:
+        if table_name == "usage_events" and not include_events:
+            continue
         rows = conn.execute(
             f"""
             SELECT rowid AS __rid, {column_name} AS value
@@ -182,11 +317,95 @@ def _canonicalize_existing_catalog_values(conn):
             )
 
 
+def _ensure_column(conn, table_name, column_name, declaration):
+    if not _table_has_column(conn, table_name, column_name):
+        conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {declaration}")
+
+
+def _table_has_column(conn, table_name, column_name):
+    return any(row[1] == column_name for row in conn.execute(f"PRAGMA table_info({table_name})"))
+
+
+def _is_table(conn, name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (name,),
+    ).fetchone()
+    return row is not None
+
+
+def _backfill_ts_epoch(conn, table_name):
+    # Walk the table in rowid chunks so a large history is never held in
+    # memory at once.
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            f"""
+            SELECT rowid AS __rid, timestamp
+            FROM {table_name}
+            WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+            """,
+            (last_rowid, _TS_EPOCH_BACKFILL_CHUNK_SIZE),
+        ).fetchall()
+        if not rows:
+            return
+        last_rowid = rows[-1]["__rid"]
+        conn.executemany(
+            f"UPDATE {table_name} SET ts_epoch = ? WHERE rowid = ?",
+            [(timestamp_epoch(row["timestamp"]), row["__rid"]) for row in rows],
+        )
+
+
 def _ensure_parent_dir(path):
     parent = os.path.dirname(path) or "."
     os.makedirs(parent, exist_ok=True)
 
 
+def _settings_file_signature():
+    try:
+        stat = os.stat(SETTINGS_PATH)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_storage_profile_name():
+    signature = _settings_file_signature()
+    if signature is not None and signature == _STORAGE_PROFILE_CACHE["signature"]:
+        return _STORAGE_PROFILE_CACHE["name"]
+
+    name = DEFAULT_STORAGE_PROFILE
+    try:
+        from backend import settings_store
+
+        name = str(settings_store.load_settings().get("storage_profile", name)).strip().lower()
+    except Exception:
+        pass
+    if name not in STORAGE_PROFILES:
+        name = DEFAULT_STORAGE_PROFILE
+
+    _STORAGE_PROFILE_CACHE["signature"] = signature
+    _STORAGE_PROFILE_CACHE["name"] = name
+    return name
+
+
+def _apply_storage_profile(conn, profile_name):
+    profile = STORAGE_PROFILES.get(profile_name, STORAGE_PROFILES[DEFAULT_STORAGE_PROFILE])
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+    try:
+        # Switching journal mode needs exclusive access; keep the current
+        # mode if another connection is holding the database open.
+        conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    except sqlite3.OperationalError:
+        pass
+    conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+    conn.execute(f"PRAGMA temp_store = {profile['temp_store']}")
+
+
 def _load_backup_preferences():
     try:
         from backend import settings_store
@@ -247,6 +466,9 @@ def _backup_database(retention_days):
 
 
 def _ensure_schema(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= _SCHEMA_VERSION:
+        return
+
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS inventory (
@@ -262,23 +484,48 @@ def _ensure_schema(conn):
             roll_weight REAL,
             times_logged_out INTEGER NOT NULL DEFAULT 0,
             is_empty INTEGER NOT NULL DEFAULT 0,
-            is_favorite INTEGER NOT NULL DEFAULT 0
+            is_favorite INTEGER NOT NULL DEFAULT 0,
+            ts_epoch INTEGER
         )
         """
     )
     conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS usage_events (
+        CREATE TABLE IF NOT EXISTS catalog_dimensions (
+            id INTEGER PRIMARY KEY,
+            field TEXT NOT NULL,
+            value TEXT NOT NULL,
+            code TEXT,
+            UNIQUE (field, value)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS roll_versions (
+            id INTEGER PRIMARY KEY,
+            barcode TEXT NOT NULL,
+            brand_id INTEGER,
+            color_id INTEGER,
+            material_id INTEGER,
+            attribute_1_id INTEGER,
+            attribute_2_id INTEGER,
+            location_id INTEGER,
+            valid_from TEXT,
+            valid_to TEXT
+        )
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS usage_event_log (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT,
+            ts_epoch INTEGER,
             event_type TEXT,
             barcode TEXT,
-            brand TEXT,
-            color TEXT,
-            material TEXT,
-            attribute_1 TEXT,
-            attribute_2 TEXT,
-            location TEXT,
+            version_id INTEGER,
             input_weight REAL,
             roll_weight REAL,
             filament_amount REAL,
@@ -288,20 +535,656 @@ def _ensure_schema(conn):
         )
         """
     )
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_timestamp ON inventory(timestamp)")
     conn.execute(
-        "CREATE INDEX IF NOT EXISTS idx_usage_events_type_time ON usage_events(event_type, timestamp)"
+        """
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS barcode_sequence (
+            name TEXT PRIMARY KEY,
+            next_serial INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analytics_cache (
+            cache_key TEXT PRIMARY KEY,
+            history_counter INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            payload TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            day TEXT NOT NULL,
+            version_id INTEGER NOT NULL,
+            used_g REAL NOT NULL DEFAULT 0,
+            event_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, version_id)
+        ) WITHOUT ROWID
+        """
+    )
+    _ensure_column(conn, "inventory", "ts_epoch", "INTEGER")
+    _ensure_column(conn, "inventory", "version_id", "INTEGER")
+    # Older databases keep events in a plain usage_events table; it is
+    # migrated in place and then replaced by the view below.
+    legacy_events = _is_table(conn, "usage_events")
+    if legacy_events:
+        _ensure_column(conn, "usage_events", "ts_epoch", "INTEGER")
+
+    conn.execute("DROP INDEX IF EXISTS idx_inventory_timestamp")
+    conn.execute("DROP INDEX IF EXISTS idx_inventory_page_timestamp")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_epoch ON inventory(ts_epoch)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_inventory_page_epoch "
+        "ON inventory(COALESCE(ts_epoch, 0), barcode)"
+    )
+    # The other inventory page sorts get the same (sort expression, barcode)
+    # index, so a keyset page seeks instead of scanning and sorting the table.
+    for sort_key, sort_expr in INVENTORY_SORT_OPTIONS.items():
+        if sort_key not in ("timestamp", "barcode"):
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_inventory_page_{sort_key} "
+                f"ON inventory({sort_expr}, barcode)"
+            )
+    # Covers the log_usage window queries (event_type = ? AND ts_epoch range)
+    # without touching the table for barcode or roll version totals.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_usage_event_log_type_epoch_cover "
+        "ON usage_event_log(event_type, ts_epoch, barcode, version_id, delta_used)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_event_log_barcode ON usage_event_log(barcode)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_roll_versions_barcode ON roll_versions(barcode, valid_to)"
     )
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_events_barcode ON usage_events(barcode)")
+
+    _ensure_search_index(conn)
+    _sync_barcode_sequence(conn)
 
     schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
     if schema_version < _CANONICALIZATION_SCHEMA_VERSION:
-        _canonicalize_existing_catalog_values(conn)
-        conn.execute(f"PRAGMA user_version = {_CANONICALIZATION_SCHEMA_VERSION}")
-
+        _canonicalize_existing_catalog_values(conn, include_events=legacy_events)
+    if schema_version < _EVENT_TYPE_SCHEMA_VERSION and legacy_events:
+        conn.execute(
+            """
+            UPDATE usage_events
+            SET event_type = LOWER(TRIM(event_type))
+            WHERE event_type IS NOT NULL AND event_type != LOWER(TRIM(event_type))
+            """
+        )
+    if schema_version < _TS_EPOCH_SCHEMA_VERSION:
+        _backfill_ts_epoch(conn, "inventory")
+        if legacy_events:
+            _backfill_ts_epoch(conn, "usage_events")
+    if schema_version < _ROLL_VERSION_SCHEMA_VERSION:
+        _sync_roll_versions(conn)
+    if legacy_events:
+        _convert_legacy_usage_events(conn)
+    for view_name, attribution in _USAGE_EVENT_VIEWS.items():
+        conn.execute(f"DROP VIEW IF EXISTS {view_name}")
+        conn.execute(_usage_events_view_sql(view_name, attribution))
+    if schema_version < _ROLL_VERSION_SCHEMA_VERSION or legacy_events:
+        rebuild_usage_rollups(conn)
+
+    conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
     conn.commit()
 
 
+# (usage_events column, catalog_dimensions field) for each roll attribute a
+# roll version stores as a dimension id.
+_EVENT_DIMENSION_COLUMNS = (
+    ("brand", "brand"),
+    ("color", "color"),
+    ("material", "material"),
+    ("attribute_1", "attribute"),
+    ("attribute_2", "attribute"),
+    ("location", "location"),
+)
+_ROLL_VERSION_DIMENSION_COLUMNS = tuple(f"{column}_id" for column, _ in _EVENT_DIMENSION_COLUMNS)
+_DIMENSION_LOOKUP_CHUNK_SIZE = 400
+_EVENT_COPY_CHUNK_SIZE = 5000
+
+ATTRIBUTION_MODES = ("current", "event_time")
+DEFAULT_ATTRIBUTION = "current"
+_USAGE_EVENT_VIEWS = {
+    "usage_events": "current",
+    "usage_events_as_logged": "event_time",
+}
+
+
+def normalize_attribution(value):
+    text = str(value or "").strip().lower()
+    return text if text in ATTRIBUTION_MODES else DEFAULT_ATTRIBUTION
+
+
+def roll_label_joins(version_sql, attribution=DEFAULT_ATTRIBUTION, columns=None):
+    """
+    LEFT JOINs exposing the labels for the roll version id in version_sql as
+    <column>_dim.value. "current" uses the attributes the roll has now (the
+    logged version for rolls no longer in inventory); "event_time" uses the
+    attributes in effect when the event was logged.
+    """
+    if columns is None:
+        columns = [column for column, _ in _EVENT_DIMENSION_COLUMNS]
+    if normalize_attribution(attribution) == "current":
+        joins = [
+            f"LEFT JOIN roll_versions AS event_version ON event_version.id = {version_sql}",
+            "LEFT JOIN inventory AS label_inventory ON label_inventory.barcode = event_version.barcode",
+            "LEFT JOIN roll_versions AS label_version "
+            "ON label_version.id = COALESCE(label_inventory.version_id, event_version.id)",
+        ]
+    else:
+        joins = [f"LEFT JOIN roll_versions AS label_version ON label_version.id = {version_sql}"]
+    for column in columns:
+        joins.append(
+            f"LEFT JOIN catalog_dimensions AS {column}_dim ON {column}_dim.id = label_version.{column}_id"
+        )
+    return "\n    ".join(joins)
+
+
+def _usage_events_view_sql(view_name, attribution):
+    label_columns = ",\n        ".join(
+        f"{column}_dim.value AS {column}" for column, _ in _EVENT_DIMENSION_COLUMNS
+    )
+    return f"""
+    CREATE VIEW {view_name} AS
+    SELECT
+        usage_event_log.id AS id,
+        usage_event_log.timestamp AS timestamp,
+        usage_event_log.event_type AS event_type,
+        usage_event_log.barcode AS barcode,
+        {label_columns},
+        usage_event_log.input_weight AS input_weight,
+        usage_event_log.roll_weight AS roll_weight,
+        usage_event_log.filament_amount AS filament_amount,
+        usage_event_log.delta_used AS delta_used,
+        usage_event_log.times_logged_out AS times_logged_out,
+        usage_event_log.source AS source,
+        usage_event_log.ts_epoch AS ts_epoch,
+        usage_event_log.version_id AS version_id
+    FROM usage_event_log
+    {roll_label_joins("usage_event_log.version_id", attribution)}
+    """
+
+
+def _dimension_code(field, value):
+    if field not in catalog_registry.MAPPING_FILENAMES:
+        return None
+    return catalog_registry.get_code_lookup(field).get(_lookup_key(value))
+
+
+def _dimension_ids(conn, pairs):
+    """
+    {(field, value): id} for catalog dimension values, adding any that are new.
+    Values keep the mapping code (brand/color/material/attribute) when known.
+    """
+    pairs = sorted({(field, value) for field, value in pairs if value is not None})
+    if not pairs:
+        return {}
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO catalog_dimensions (field, value, code) VALUES (?, ?, ?)",
+        [(field, value, _dimension_code(field, value)) for field, value in pairs],
+    )
+    ids = {}
+    for start in range(0, len(pairs), _DIMENSION_LOOKUP_CHUNK_SIZE):
+        chunk = pairs[start:start + _DIMENSION_LOOKUP_CHUNK_SIZE]
+        placeholders = ", ".join("(?, ?)" for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT id, field, value
+            FROM catalog_dimensions
+            WHERE (field, value) IN (VALUES {placeholders})
+            """,
+            tuple(item for pair in chunk for item in pair),
+        ).fetchall()
+        for row in rows:
+            ids[(row["field"], row["value"])] = row["id"]
+    return ids
+
+
+def _label_pairs(labels):
+    return [(field, value) for (_, field), value in zip(_EVENT_DIMENSION_COLUMNS, labels)]
+
+
+def _dimension_key(ids, labels):
+    return tuple(ids.get(pair) for pair in _label_pairs(labels))
+
+
+def _version_barcode(barcode):
+    return str(barcode or "").strip()
+
+
+def _insert_roll_version(conn, barcode, dimension_key, valid_from, valid_to=None):
+    cursor = conn.execute(
+        f"""
+        INSERT INTO roll_versions (barcode, {", ".join(_ROLL_VERSION_DIMENSION_COLUMNS)}, valid_from, valid_to)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (barcode,) + tuple(dimension_key) + (valid_from, valid_to),
+    )
+    return cursor.lastrowid
+
+
+def _open_roll_version(conn, barcode, dimension_key, valid_from):
+    conn.execute(
+        "UPDATE roll_versions SET valid_to = ? WHERE barcode = ? AND valid_to IS NULL",
+        (valid_from or _normalize_timestamp(datetime.now()), barcode),
+    )
+    version_id = _insert_roll_version(conn, barcode, dimension_key, valid_from)
+    conn.execute("UPDATE inventory SET version_id = ? WHERE barcode = ?", (version_id, barcode))
+    return version_id
+
+
+def open_roll_version(conn, barcode, labels, valid_from=None):
+    """
+    Start a new attribute version for an inventory roll inside the caller's
+    transaction. labels are (brand, color, material, attribute_1, attribute_2,
+    location). The roll's current version is closed at valid_from and
+    inventory points at the new one. Returns the new version id.
+    """
+    ids = _dimension_ids(conn, _label_pairs(labels))
+    return _open_roll_version(conn, _version_barcode(barcode), _dimension_key(ids, labels), valid_from)
+
+
+def _sync_roll_versions(conn, valid_from=None):
+    """
+    Give every inventory roll a current version matching its labels. A roll
+    without any version gets one with no valid_from, covering its whole
+    history. Returns the number of versions opened.
+    """
+    label_columns = [column for column, _ in _EVENT_DIMENSION_COLUMNS]
+    rows = conn.execute(
+        f"""
+        SELECT
+            inventory.barcode AS barcode,
+            inventory.version_id AS version_id,
+            {", ".join(f"inventory.{column} AS {column}" for column in label_columns)},
+            {", ".join(f"roll_versions.{column} AS {column}" for column in _ROLL_VERSION_DIMENSION_COLUMNS)}
+        FROM inventory
+        LEFT JOIN roll_versions ON roll_versions.id = inventory.version_id
+        """
+    ).fetchall()
+    ids = _dimension_ids(
+        conn,
+        (pair for row in rows for pair in _label_pairs([row[column] for column in label_columns])),
+    )
+
+    opened = 0
+    for row in rows:
+        dimension_key = _dimension_key(ids, [row[column] for column in label_columns])
+        if row["version_id"] is not None:
+            if dimension_key == tuple(row[column] for column in _ROLL_VERSION_DIMENSION_COLUMNS):
+                continue
+            _open_roll_version(conn, row["barcode"], dimension_key, valid_from)
+        else:
+            _open_roll_version(conn, row["barcode"], dimension_key, None)
+        opened += 1
+    return opened
+
+
+def _note_version_span(wanted, key, timestamp):
+    span = wanted.setdefault(key, [None, None])
+    if timestamp is None:
+        return
+    text = str(timestamp)
+    if span[0] is None or text < span[0]:
+        span[0] = text
+    if span[1] is None or text > span[1]:
+        span[1] = text
+
+
+def _resolve_event_versions(conn, wanted, resolved):
+    """
+    Add {(barcode, dimension key): version id} to resolved for each key in
+    wanted ({key: [first timestamp, last timestamp]}). Events match the roll's
+    current version when the labels agree. Labels no version has yet are kept
+    as a historical version spanning those events.
+    """
+    missing = [key for key in wanted if key not in resolved]
+    if not missing:
+        return resolved
+
+    barcodes = sorted({barcode for barcode, _ in missing})
+    open_versions = set()
+    for start in range(0, len(barcodes), _DIMENSION_LOOKUP_CHUNK_SIZE):
+        chunk = barcodes[start:start + _DIMENSION_LOOKUP_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT id, barcode, {", ".join(_ROLL_VERSION_DIMENSION_COLUMNS)}, valid_to
+            FROM roll_versions
+            WHERE barcode IN ({placeholders})
+            ORDER BY valid_to IS NULL, id
+            """,
+            tuple(chunk),
+        ).fetchall()
+        # Open versions sort last, so they win over older versions that
+        # happen to carry the same labels.
+        for row in rows:
+            key = (row["barcode"], tuple(row[column] for column in _ROLL_VERSION_DIMENSION_COLUMNS))
+            if key in wanted:
+                resolved[key] = row["id"]
+            if row["valid_to"] is None:
+                open_versions.add(row["barcode"])
+
+    unmatched = sorted(
+        (key for key in missing if key not in resolved),
+        key=lambda key: wanted[key][1] or "",
+        reverse=True,
+    )
+    for key in unmatched:
+        barcode, dimension_key = key
+        valid_from, valid_to = wanted[key]
+        if barcode not in open_versions:
+            # The most recent labels of a roll with no current version
+            # (e.g. one that was removed from inventory) stay open.
+            valid_to = None
+            open_versions.add(barcode)
+        resolved[key] = _insert_roll_version(conn, barcode, dimension_key, valid_from, valid_to)
+    return resolved
+
+
+_INSERT_EVENT_LOG_SQL = """
+    INSERT INTO usage_event_log (
+        id,
+        timestamp,
+        ts_epoch,
+        event_type,
+        barcode,
+        version_id,
+        input_weight,
+        roll_weight,
+        filament_amount,
+        delta_used,
+        times_logged_out,
+        source
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def insert_usage_events(conn, rows):
+    """
+    Append events given in the usage_events column order (timestamp,
+    event_type, barcode, brand, color, material, attribute_1, attribute_2,
+    location, input_weight, roll_weight, filament_amount, delta_used,
+    times_logged_out, source, ts_epoch). Each event points at the roll version
+    carrying its labels. Returns the version id of every row, in order.
+    """
+    if not rows:
+        return []
+
+    label_slice = slice(3, 3 + len(_EVENT_DIMENSION_COLUMNS))
+    ids = _dimension_ids(conn, (pair for row in rows for pair in _label_pairs(row[label_slice])))
+    keys = [(_version_barcode(row[2]), _dimension_key(ids, row[label_slice])) for row in rows]
+    wanted = {}
+    for row, key in zip(rows, keys):
+        _note_version_span(wanted, key, row[0])
+    resolved = _resolve_event_versions(conn, wanted, {})
+
+    version_ids = [resolved[key] for key in keys]
+    conn.executemany(
+        _INSERT_EVENT_LOG_SQL,
+        [
+            (None, row[0], row[15], row[1], row[2], version_id) + tuple(row[label_slice.stop:15])
+            for row, version_id in zip(rows, version_ids)
+        ],
+    )
+    # Usage logged for an earlier day (or with no usable timestamp) changes
+    # totals that may be cached for closed date ranges; same-day logs only
+    # land in the live part of a report.
+    today = datetime.now().strftime("%Y-%m-%d")
+    if any(row[1] == "log_usage" and usage_rollup_day(row[0]) < today for row in rows):
+        bump_usage_history_counter(conn)
+    return version_ids
+
+
+def _copy_events_with_versions(conn, select_sql):
+    """
+    Copy events from an older event table into usage_event_log. select_sql
+    returns id, timestamp, ts_epoch, event_type, barcode, the six dimension
+    ids, then the weight and source columns.
+    """
+    dimension_slice = slice(5, 5 + len(_ROLL_VERSION_DIMENSION_COLUMNS))
+    resolved = {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT * FROM ({select_sql}) WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, _EVENT_COPY_CHUNK_SIZE),
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+
+        keys = [(_version_barcode(row["barcode"]), tuple(row[dimension_slice])) for row in rows]
+        wanted = {}
+        for row, key in zip(rows, keys):
+            _note_version_span(wanted, key, row["timestamp"])
+        _resolve_event_versions(conn, wanted, resolved)
+        conn.executemany(
+            _INSERT_EVENT_LOG_SQL,
+            [
+                tuple(row[:5]) + (resolved[key],) + tuple(row[dimension_slice.stop:])
+                for row, key in zip(rows, keys)
+            ],
+        )
+
+
+def _convert_legacy_usage_events(conn):
+    pairs = set()
+    for column_name, field_name in _EVENT_DIMENSION_COLUMNS:
+        for row in conn.execute(
+            f"SELECT DISTINCT {column_name} FROM usage_events WHERE {column_name} IS NOT NULL"
+        ):
+            pairs.add((field_name, row[0]))
+    _dimension_ids(conn, pairs)
+
+    id_columns = ",\n".join(
+        f"(SELECT id FROM catalog_dimensions "
+        f"WHERE field = '{field_name}' AND value = usage_events.{column_name}) AS {column_name}_id"
+        for column_name, field_name in _EVENT_DIMENSION_COLUMNS
+    )
+    _copy_events_with_versions(
+        conn,
+        f"""
+        SELECT
+            id,
+            timestamp,
+            ts_epoch,
+            event_type,
+            barcode,
+            {id_columns},
+            input_weight,
+            roll_weight,
+            filament_amount,
+            delta_used,
+            times_logged_out,
+            source
+        FROM usage_events
+        """,
+    )
+    conn.execute("DROP TABLE usage_events")
+
+
+_FTS_COLUMNS = (
+    "barcode",
+    "brand",
+    "color",
+    "material",
+    "attribute_1",
+    "attribute_2",
+    "location",
+)
+_FTS_RANK_WEIGHTS = (10.0, 4.0, 5.0, 4.0, 2.0, 2.0, 1.0, 1.0)
+
+
+def _fts_values_sql(prefix):
+    columns = ", ".join(f"{prefix}.{column}" for column in _FTS_COLUMNS)
+    tokens = (
+        "COALESCE((SELECT tokens FROM inventory_color_tokens "
+        f"WHERE color_key = LOWER(TRIM(COALESCE({prefix}.color, '')))), '')"
+    )
+    return f"{prefix}.rowid, {columns}, {tokens}"
+
+
+def _ensure_search_index(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS inventory_color_tokens (
+            color_key TEXT PRIMARY KEY,
+            tokens TEXT NOT NULL
+        )
+        """
+    )
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+                barcode,
+                brand,
+                color,
+                material,
+                attribute_1,
+                attribute_2,
+                location,
+                color_tokens,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '1 2 3'
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: search falls back to LIKE filters.
+        return
+
+    fts_columns = ", ".join(_FTS_COLUMNS)
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_insert
+        AFTER INSERT ON inventory
+        BEGIN
+            INSERT INTO inventory_fts (rowid, {fts_columns}, color_tokens)
+            SELECT {_fts_values_sql("new")};
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_update
+        AFTER UPDATE OF {fts_columns} ON inventory
+        BEGIN
+            DELETE FROM inventory_fts WHERE rowid = old.rowid;
+            INSERT INTO inventory_fts (rowid, {fts_columns}, color_tokens)
+            SELECT {_fts_values_sql("new")};
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_delete
+        AFTER DELETE ON inventory
+        BEGIN
+            DELETE FROM inventory_fts WHERE rowid = old.rowid;
+        END
+        """
+    )
+
+
+def _has_search_index(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inventory_fts' LIMIT 1"
+    ).fetchone()
+    return row is not None
+
+
+def _sync_search_index(conn):
+    """
+    Refresh color-family tokens from color_mapping.json and rebuild the
+    full-text index when they changed since the last sync.
+    """
+    if not _has_search_index(conn):
+        return False
+
+    token_rows = sorted(
+        (color_key, " ".join(tokens))
+        for color_key, tokens in color_search.get_color_search_tokens_by_color().items()
+    )
+    signature = hashlib.sha1(
+        json.dumps(token_rows, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    if get_meta_value(conn, _COLOR_TOKENS_META_KEY) == signature:
+        return True
+
+    fts_columns = ", ".join(_FTS_COLUMNS)
+    conn.execute("DELETE FROM inventory_color_tokens")
+    conn.executemany(
+        "INSERT INTO inventory_color_tokens (color_key, tokens) VALUES (?, ?)",
+        token_rows,
+    )
+    conn.execute("DELETE FROM inventory_fts")
+    conn.execute(
+        f"""
+        INSERT INTO inventory_fts (rowid, {fts_columns}, color_tokens)
+        SELECT {_fts_values_sql("inventory")}
+        FROM inventory
+        """
+    )
+    set_meta_value(conn, _COLOR_TOKENS_META_KEY, signature)
+    return True
+
+
+def _resync_search_index():
+    with open_database(write=True) as conn:
+        return _sync_search_index(conn)
+
+
+def get_meta_value(conn, key, default=None):
+    row = conn.execute("SELECT value FROM app_meta WHERE key = ? LIMIT 1", (key,)).fetchone()
+    if row is None:
+        return default
+    return row["value"]
+
+
+def set_meta_value(conn, key, value):
+    conn.execute(
+        """
+        INSERT INTO app_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """,
+        (key, None if value is None else str(value)),
+    )
+
+
+_USAGE_HISTORY_COUNTER_KEY = "usage_history_counter"
+
+
+def get_usage_history_counter(conn):
+    return _to_int(get_meta_value(conn, _USAGE_HISTORY_COUNTER_KEY), 0)
+
+
+def bump_usage_history_counter(conn):
+    """
+    Mark usage history before today as changed, so analytics cached for
+    closed date ranges are recomputed.
+    """
+    conn.execute(
+        """
+        INSERT INTO app_meta (key, value) VALUES (?, '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        """,
+        (_USAGE_HISTORY_COUNTER_KEY,),
+    )
+
+
 def _resolve_inventory_sheet(workbook):
     if workbook is None:
         return None
@@ -332,9 +1215,10 @@ def _import_inventory_rows(conn, inventory_sheet):
         if not barcode:
             continue
 
+        timestamp = _normalize_timestamp(row[0] if len(row) > 0 else None)
         rows.append(
             (
-                _normalize_timestamp(row[0] if len(row) > 0 else None),
+                timestamp,
                 barcode,
                 normalize_text_case(row[2] if len(row) > 2 else None, field="brand"),
                 normalize_text_case(row[3] if len(row) > 3 else None, field="color"),
@@ -347,13 +1231,14 @@ def _import_inventory_rows(conn, inventory_sheet):
                 _to_int(row[10] if len(row) > 10 else None, 0),
                 1 if _to_bool(row[11] if len(row) > 11 else None, False) else 0,
                 1 if _to_bool(row[12] if len(row) > 12 else None, False) else 0,
+                timestamp_epoch(timestamp),
             )
         )
 
     if rows:
         conn.executemany(
             """
-            INSERT OR REPLACE INTO inventory (
+            INSERT INTO inventory (
                 timestamp,
                 barcode,
                 brand,
@@ -366,11 +1251,28 @@ def _import_inventory_rows(conn, inventory_sheet):
                 roll_weight,
                 times_logged_out,
                 is_empty,
-                is_favorite
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                is_favorite,
+                ts_epoch
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(barcode) DO UPDATE SET
+                timestamp = excluded.timestamp,
+                ts_epoch = excluded.ts_epoch,
+                brand = excluded.brand,
+                color = excluded.color,
+                material = excluded.material,
+                attribute_1 = excluded.attribute_1,
+                attribute_2 = excluded.attribute_2,
+                filament_amount = excluded.filament_amount,
+                location = excluded.location,
+                roll_weight = excluded.roll_weight,
+                times_logged_out = excluded.times_logged_out,
+                is_empty = excluded.is_empty,
+                is_favorite = excluded.is_favorite
             """,
             rows,
         )
+        _sync_barcode_sequence(conn)
+        _sync_roll_versions(conn, valid_from=_normalize_timestamp(datetime.now()))
     return len(rows)
 
 
@@ -380,10 +1282,11 @@ def _import_event_rows(conn, events_sheet):
 
     rows = []
     for row in events_sheet.iter_rows(min_row=2, values_only=True):
+        timestamp = _normalize_timestamp(row[0] if len(row) > 0 else None)
         rows.append(
             (
-                _normalize_timestamp(row[0] if len(row) > 0 else None),
-                row[1] if len(row) > 1 else None,
+                timestamp,
+                normalize_event_type(row[1] if len(row) > 1 else None),
                 str(row[2]).strip() if len(row) > 2 and row[2] is not None else None,
                 normalize_text_case(row[3] if len(row) > 3 else None, field="brand"),
                 normalize_text_case(row[4] if len(row) > 4 else None, field="color"),
@@ -397,41 +1300,36 @@ def _import_event_rows(conn, events_sheet):
                 _to_float(row[12] if len(row) > 12 else None),
                 _to_int(row[13] if len(row) > 13 else None, 0),
                 row[14] if len(row) > 14 else None,
+                timestamp_epoch(timestamp),
             )
         )
 
     if rows:
-        conn.executemany(
-            """
-            INSERT INTO usage_events (
-                timestamp,
-                event_type,
-                barcode,
-                brand,
-                color,
-                material,
-                attribute_1,
-                attribute_2,
-                location,
-                input_weight,
-                roll_weight,
-                filament_amount,
-                delta_used,
-                times_logged_out,
-                source
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            rows,
-        )
+        insert_usage_events(conn, rows)
+        rebuild_usage_rollups(conn)
     return len(rows)
 
 
 def _try_migrate_from_excel(conn):
-    inventory_count = conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
-    event_count = conn.execute("SELECT COUNT(*) FROM usage_events").fetchone()[0]
-    if inventory_count or event_count:
+    # The import decision is recorded once so later opens never have to
+    # inspect table contents again.
+    if get_meta_value(conn, _LEGACY_IMPORT_META_KEY) is not None:
+        return
+
+    has_rows = conn.execute(
+        """
+        SELECT
+            EXISTS(SELECT 1 FROM inventory LIMIT 1)
+            OR EXISTS(SELECT 1 FROM usage_event_log LIMIT 1)
+        """
+    ).fetchone()[0]
+    if has_rows:
+        set_meta_value(conn, _LEGACY_IMPORT_META_KEY, "skipped_existing_data")
+        conn.commit()
         return
     if not os.path.exists(EXCEL_PATH):
+        set_meta_value(conn, _LEGACY_IMPORT_META_KEY, "skipped_no_workbook")
+        conn.commit()
         return
 
     try:
@@ -444,6 +1342,7 @@ def _try_migrate_from_excel(conn):
         workbook = openpyxl.load_workbook(EXCEL_PATH, data_only=True)
         _import_inventory_rows(conn, _resolve_inventory_sheet(workbook))
         _import_event_rows(conn, _resolve_events_sheet(workbook))
+        set_meta_value(conn, _LEGACY_IMPORT_META_KEY, "imported")
         conn.commit()
     except Exception:
         conn.rollback()
@@ -472,6 +1371,8 @@ def convert_excel_to_database(excel_path=None, database_path=None, overwrite=Fal
             raise FileExistsError(
                 f"Target database already exists: {target_path} (use overwrite=True to replace it)"
             )
+        if target_path == os.path.abspath(DATABASE_PATH):
+            close_database_connections()
         os.remove(target_path)
 
     conn = sqlite3.connect(target_path, timeout=30)
@@ -483,6 +1384,7 @@ def convert_excel_to_database(excel_path=None, database_path=None, overwrite=Fal
         workbook = openpyxl.load_workbook(source_path, data_only=True)
         inventory_rows = _import_inventory_rows(conn, _resolve_inventory_sheet(workbook))
         event_rows = _import_event_rows(conn, _resolve_events_sheet(workbook))
+        set_meta_value(conn, _LEGACY_IMPORT_META_KEY, "converted")
         conn.commit()
 
         return {
@@ -500,8 +1402,105 @@ def convert_excel_to_database(excel_path=None, database_path=None, overwrite=Fal
         conn.close()
 
 
+def _connect(path, profile_name):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        _apply_storage_profile(conn, profile_name)
+    except Exception:
+        _close_quietly(conn)
+        raise
+    return conn
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _acquire_connection():
+    path = os.path.abspath(DATABASE_PATH)
+    profile_name = get_storage_profile_name()
+    key = (path, os.getpid(), profile_name)
+    stale = []
+
+    with _POOL_LOCK:
+        if _POOL["key"] != key or not os.path.exists(path):
+            if _POOL["key"] is not None and _POOL["key"][1] == key[1]:
+                stale = _POOL["idle"]
+            _POOL["key"] = key
+            _POOL["idle"] = []
+            _POOL["schema_ready"] = False
+            _POOL["fts"] = False
+        conn = _POOL["idle"].pop() if _POOL["idle"] else None
+        schema_ready = _POOL["schema_ready"]
+
+    for old_conn in stale:
+        _close_quietly(old_conn)
+
+    if conn is None:
+        conn = _connect(path, profile_name)
+
+    if not schema_ready:
+        try:
+            _ensure_schema(conn)
+            _try_migrate_from_excel(conn)
+            catalog_signature = catalog_registry.catalog_signature()
+            fts_ready = _sync_search_index(conn)
+            conn.commit()
+        except Exception:
+            _close_quietly(conn)
+            raise
+        with _POOL_LOCK:
+            if _POOL["key"] == key:
+                _POOL["schema_ready"] = True
+                _POOL["fts"] = fts_ready
+                _SEARCH_SYNC_STATE["signature"] = catalog_signature
+                _SEARCH_SYNC_STATE["checked_at"] = time.monotonic()
+
+    return conn, key
+
+
+def _release_connection(conn, key):
+    if not conn.in_transaction:
+        with _POOL_LOCK:
+            if _POOL["key"] == key and len(_POOL["idle"]) < _POOL_MAX_IDLE_CONNECTIONS:
+                _POOL["idle"].append(conn)
+                return
+    _close_quietly(conn)
+
+
+def close_database_connections():
+    """
+    Close pooled idle connections and force the next open to reconnect
+    and re-check the schema. Connections currently in use are closed when
+    they are released.
+    """
+    with _POOL_LOCK:
+        idle = _POOL["idle"] if _POOL["key"] is not None and _POOL["key"][1] == os.getpid() else []
+        _POOL["key"] = None
+        _POOL["idle"] = []
+        _POOL["schema_ready"] = False
+        _POOL["fts"] = False
+
+    for conn in idle:
+        _close_quietly(conn)
+
+
 @contextmanager
 def open_database(write=False):
+    state = _THREAD_STATE
+    active = getattr(state, "conn", None)
+    if active is not None:
+        # Nested opens on the same thread share the outer connection and
+        # transaction; the outermost context commits or rolls back.
+        if write:
+            state.write = True
+        yield active
+        return
+
     _ensure_parent_dir(DATABASE_PATH)
 
     if write:
@@ -509,21 +1508,26 @@ def open_database(write=False):
         if backup_enabled:
             _backup_database(backup_retention_days)
 
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30)
-    conn.row_factory = sqlite3.Row
+    conn, key = _acquire_connection()
+    state.conn = conn
+    state.write = write
 
     try:
-        _ensure_schema(conn)
-        _try_migrate_from_excel(conn)
         yield conn
-        if write:
+        if state.write:
             conn.commit()
+        elif conn.in_transaction:
+            conn.rollback()
     except Exception:
-        if write:
+        try:
             conn.rollback()
+        except Exception:
+            pass
         raise
     finally:
-        conn.close()
+        state.conn = None
+        state.write = False
+        _release_connection(conn, key)
 
 
 def _inventory_row_to_tuple(row):
@@ -590,6 +1594,491 @@ def list_inventory_rows():
         return [_inventory_row_to_tuple(row) for row in rows]
 
 
+def list_empty_inventory_rows(empty_threshold, limit=None, after=None):
+    """
+    Rolls flagged empty or at/below the threshold, most recently logged first
+    (rows without a usable timestamp last). With a limit, only that many rows
+    are read; after=(sort_value, barcode) from a previous page continues it.
+    """
+    # Walking the (COALESCE(ts_epoch, 0), barcode) page index backwards gives
+    # the rows already in order, so a LIMIT stops the scan early.
+    where = ["(is_empty != 0 OR filament_amount <= ?)"]
+    params = [_to_float(empty_threshold, 0.0)]
+    if after is not None:
+        where.append("COALESCE(ts_epoch, 0) <= ?")
+        where.append("(COALESCE(ts_epoch, 0), barcode) < (?, ?)")
+        params.extend((after[0], after[0], after[1]))
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT ?"
+        params.append(max(_to_int(limit, 0), 0))
+
+    with open_database(write=False) as conn:
+        rows = conn.execute(
+            f"""
+            SELECT
+                timestamp,
+                barcode,
+                brand,
+                color,
+                material,
+                attribute_1,
+                attribute_2,
+                filament_amount,
+                location,
+                roll_weight,
+                times_logged_out,
+                is_empty,
+                is_favorite,
+                COALESCE(ts_epoch, 0) AS sort_value
+            FROM inventory
+            WHERE {" AND ".join(where)}
+            ORDER BY COALESCE(ts_epoch, 0) DESC, barcode DESC
+            {limit_sql}
+            """,
+            tuple(params),
+        ).fetchall()
+        return [_inventory_row_to_tuple(row) + (row["sort_value"],) for row in rows]
+
+
+INVENTORY_SORT_OPTIONS = {
+    "timestamp": "COALESCE(ts_epoch, 0)",
+    "barcode": "barcode",
+    "brand": "COALESCE(brand, '')",
+    "color": "COALESCE(color, '')",
+    "material": "COALESCE(material, '')",
+    "filament_amount": "COALESCE(filament_amount, 0)",
+    "location": "COALESCE(location, '')",
+    "times_logged_out": "COALESCE(times_logged_out, 0)",
+}
+_INVENTORY_SEARCH_COLUMNS = (
+    "timestamp",
+    "barcode",
+    "brand",
+    "color",
+    "material",
+    "attribute_1",
+    "attribute_2",
+    "location",
+)
+_FAVORITE_SEARCH_TERMS = ("favorite", "starred")
+
+
+def encode_keyset_cursor(*values):
+    """
+    Opaque page cursor holding the sort key of the last row shown.
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_keyset_cursor(cursor, size):
+    text = str(cursor or "").strip()
+    if not text:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+        values = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return tuple(values)
+
+
+def encode_inventory_cursor(sort_value, barcode):
+    return encode_keyset_cursor(sort_value, barcode)
+
+
+def decode_inventory_cursor(cursor):
+    position = decode_keyset_cursor(cursor, 2)
+    if position is None or not isinstance(position[1], str):
+        return None
+    return position
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _split_search_terms(search):
+    terms = [term for term in str(search or "").lower().split() if term]
+    favorites_only = any(term in _FAVORITE_SEARCH_TERMS for term in terms)
+    terms = [term for term in terms if term not in _FAVORITE_SEARCH_TERMS]
+    return terms, favorites_only
+
+
+def build_fts_query(terms):
+    # Every term must match; each is quoted (so punctuation is literal) and
+    # prefix-matched so partially typed words already find rows.
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+def _inventory_like_filter(terms):
+    clauses = []
+    params = []
+    color_tokens = color_search.get_color_search_tokens_by_color() if terms else {}
+    for term in terms:
+        pattern = f"%{_escape_like(term)}%"
+        options = [f"{column} LIKE ? ESCAPE '\\'" for column in _INVENTORY_SEARCH_COLUMNS]
+        params.extend(pattern for _ in _INVENTORY_SEARCH_COLUMNS)
+
+        category_colors = sorted(
+            color_name
+            for color_name, tokens in color_tokens.items()
+            if any(term in token for token in tokens)
+        )
+        if category_colors:
+            placeholders = ", ".join("?" for _ in category_colors)
+            options.append(f"LOWER(COALESCE(color, '')) IN ({placeholders})")
+            params.extend(category_colors)
+
+        clauses.append("(" + " OR ".join(options) + ")")
+    return clauses, params
+
+
+def _inventory_search_filter(search, use_fts):
+    terms, favorites_only = _split_search_terms(search)
+
+    clauses = []
+    params = []
+    if favorites_only:
+        clauses.append("is_favorite = 1")
+
+    if terms and use_fts:
+        clauses.append("rowid IN (SELECT rowid FROM inventory_fts WHERE inventory_fts MATCH ?)")
+        params.append(build_fts_query(terms))
+    elif terms:
+        like_clauses, like_params = _inventory_like_filter(terms)
+        clauses.extend(like_clauses)
+        params.extend(like_params)
+
+    return clauses, params
+
+
+def _search_index_ready():
+    """
+    Whether searches can use inventory_fts. Like the canonicalization cache,
+    the catalog files are checked at most once per interval; after an edit
+    the color tokens are re-synced (on the writer thread) before searching.
+    Call it before opening the read connection.
+    """
+    with _POOL_LOCK:
+        schema_ready = _POOL["schema_ready"]
+    if not schema_ready:
+        # The first open sets up the schema and the search index.
+        with open_database(write=False):
+            pass
+    with _POOL_LOCK:
+        fts_ready = bool(_POOL["fts"])
+        checked_at = _SEARCH_SYNC_STATE["checked_at"]
+        synced_signature = _SEARCH_SYNC_STATE["signature"]
+    now = time.monotonic()
+    if not fts_ready or (
+        checked_at is not None and now - checked_at < _CANONICALIZATION_CHECK_INTERVAL_SEC
+    ):
+        return fts_ready
+
+    signature = catalog_registry.catalog_signature()
+    if signature != synced_signature:
+        from backend import write_queue
+
+        fts_ready = bool(write_queue.run(_resync_search_index))
+    with _POOL_LOCK:
+        _POOL["fts"] = fts_ready
+        _SEARCH_SYNC_STATE["signature"] = signature
+        _SEARCH_SYNC_STATE["checked_at"] = now
+    return fts_ready
+
+
+def count_inventory_rows(conn=None):
+    if conn is not None:
+        return conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+    with open_database(write=False) as read_conn:
+        return read_conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+
+
+def build_inventory_page_query(sort_key, descending, limit, position=None, where=(), params=()):
+    """
+    (sql, params) for one inventory page ordered by INVENTORY_SORT_OPTIONS[sort_key]
+    then barcode, starting after position ((sort_value, barcode) or None).
+    """
+    sort_expr = INVENTORY_SORT_OPTIONS[sort_key]
+    order = "DESC" if descending else "ASC"
+    # barcode is unique, so sorting by it needs no tie-breaker; repeating it
+    # would make SQLite sort the rows again.
+    order_sql = f"{sort_expr} {order}"
+    if sort_expr != "barcode":
+        order_sql += f", barcode {order}"
+    page_where = list(where)
+    page_params = list(params)
+    if position is not None:
+        operator = "<" if descending else ">"
+        if sort_expr == "barcode":
+            page_where.append(f"barcode {operator} ?")
+            page_params.append(position[1])
+        else:
+            # The single-column bound lets SQLite seek the sort index; the row
+            # value comparison then skips ties already shown on earlier pages.
+            page_where.append(f"{sort_expr} {operator}= ?")
+            page_where.append(f"({sort_expr}, barcode) {operator} (?, ?)")
+            page_params.extend((position[0], position[0], position[1]))
+    page_filter_sql = ("WHERE " + " AND ".join(page_where)) if page_where else ""
+
+    sql = f"""
+        SELECT
+            timestamp,
+            barcode,
+            brand,
+            color,
+            material,
+            attribute_1,
+            attribute_2,
+            filament_amount,
+            location,
+            roll_weight,
+            times_logged_out,
+            is_empty,
+            is_favorite,
+            {sort_expr} AS sort_value
+        FROM inventory
+        {page_filter_sql}
+        ORDER BY {order_sql}
+        LIMIT ?
+        """
+    return sql, tuple(page_params) + (limit,)
+
+
+def query_inventory_page(
+    limit=20,
+    sort="timestamp",
+    direction="desc",
+    cursor=None,
+    search="",
+    include_total=False,
+):
+    """
+    Return one keyset-paginated page of inventory rows.
+    Result: {"rows", "next_cursor", "total"} where total is None unless requested.
+    """
+    sort_key = str(sort or "timestamp").strip().lower()
+    if sort_key not in INVENTORY_SORT_OPTIONS:
+        sort_key = "timestamp"
+    descending = str(direction or "desc").strip().lower() != "asc"
+    page_size = max(1, min(_to_int(limit, 20), 500))
+    position = decode_inventory_cursor(cursor)
+
+    use_fts = _search_index_ready() if search else False
+    with open_database(write=False) as conn:
+        where, params = _inventory_search_filter(search, use_fts)
+        filter_sql = ("WHERE " + " AND ".join(where)) if where else ""
+
+        sql, page_params = build_inventory_page_query(
+            sort_key, descending, page_size + 1, position, where, params
+        )
+        rows = conn.execute(sql, page_params).fetchall()
+
+        total = None
+        if include_total:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM inventory {filter_sql}", tuple(params)
+            ).fetchone()[0]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_inventory_cursor(last["sort_value"], last["barcode"])
+
+    return {
+        "rows": [_inventory_row_to_dict(row) for row in rows],
+        "next_cursor": next_cursor,
+        "total": total,
+        "sort": sort_key,
+        "direction": "desc" if descending else "asc",
+    }
+
+
+def search_inventory(search, limit=20):
+    """
+    Ranked full-text search over inventory (prefix matching, best match first).
+    Falls back to unranked LIKE matching when SQLite lacks FTS5.
+    """
+    terms, favorites_only = _split_search_terms(search)
+    page_size = max(1, min(_to_int(limit, 20), 200))
+    if not terms and not favorites_only:
+        return []
+
+    use_fts = bool(terms) and _search_index_ready()
+    with open_database(write=False) as conn:
+        if use_fts:
+            weights = ", ".join(str(weight) for weight in _FTS_RANK_WEIGHTS)
+            favorite_sql = "AND inventory.is_favorite = 1" if favorites_only else ""
+            rows = conn.execute(
+                f"""
+                SELECT inventory.*
+                FROM inventory_fts
+                JOIN inventory ON inventory.rowid = inventory_fts.rowid
+                WHERE inventory_fts MATCH ?
+                {favorite_sql}
+                ORDER BY bm25(inventory_fts, {weights}), inventory.barcode
+                LIMIT ?
+                """,
+                (build_fts_query(terms), page_size),
+            ).fetchall()
+        else:
+            where, params = _inventory_search_filter(search, False)
+            rows = conn.execute(
+                f"""
+                SELECT *
+                FROM inventory
+                WHERE {" AND ".join(where)}
+                ORDER BY COALESCE(ts_epoch, 0) DESC, barcode DESC
+                LIMIT ?
+                """,
+                tuple(params) + (page_size,),
+            ).fetchall()
+
+    return [_inventory_row_to_dict(row) for row in rows]
+
+
+_ROLLUP_DAY_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}")
+ROLLUP_DAY_SQL = (
+    "CASE WHEN timestamp GLOB "
+    "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]' "
+    "THEN SUBSTR(timestamp, 1, 10) ELSE '' END"
+)
+_ROLLUP_EVENT_FILTER_SQL = "event_type = 'log_usage' AND delta_used > 0"
+
+
+def usage_rollup_day(timestamp):
+    """
+    Day key an event is rolled up under. Only "YYYY-MM-DD HH:MM:SS" timestamps
+    get a day; anything else is rolled up under '' and counts toward all-time
+    totals only.
+    """
+    if not isinstance(timestamp, str) or not _ROLLUP_DAY_PATTERN.fullmatch(timestamp):
+        return ""
+    return timestamp[:10]
+
+
+def add_usage_rollups(conn, entries):
+    """
+    Fold new log_usage events into the daily rollup inside the caller's
+    transaction. Entries are (timestamp, version_id, used_g).
+    """
+    daily = {}
+    for timestamp, version_id, used_g in entries:
+        used_value = _to_float(used_g)
+        if version_id is None or used_value is None or used_value <= 0:
+            continue
+        bucket = daily.setdefault((usage_rollup_day(timestamp), version_id), [0.0, 0])
+        bucket[0] += used_value
+        bucket[1] += 1
+
+    if daily:
+        conn.executemany(
+            """
+            INSERT INTO usage_daily (day, version_id, used_g, event_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(day, version_id) DO UPDATE SET
+                used_g = used_g + excluded.used_g,
+                event_count = event_count + excluded.event_count
+            """,
+            [key + (used, count) for key, (used, count) in daily.items()],
+        )
+
+
+def rebuild_usage_rollups(conn=None):
+    """
+    Recompute usage_daily from the full event history.
+    Returns the number of rollup rows written.
+    """
+    if conn is None:
+        with open_database(write=True) as write_conn:
+            return rebuild_usage_rollups(write_conn)
+
+    bump_usage_history_counter(conn)
+    conn.execute("DELETE FROM usage_daily")
+    conn.execute(
+        f"""
+        INSERT INTO usage_daily (day, version_id, used_g, event_count)
+        SELECT {ROLLUP_DAY_SQL}, version_id, SUM(delta_used), COUNT(*)
+        FROM usage_event_log
+        WHERE {_ROLLUP_EVENT_FILTER_SQL} AND version_id IS NOT NULL
+        GROUP BY 1, 2
+        """
+    )
+    return conn.execute("SELECT COUNT(*) FROM usage_daily").fetchone()[0]
+
+
+def _barcode_serial(barcode):
+    text = str(barcode or "").strip()
+    if len(text) != 17 or not text.isdigit():
+        return None
+    return int(text[-5:])
+
+
+def _sync_barcode_sequence(conn):
+    # One-time scan used when seeding the sequence or after bulk imports;
+    # allocation itself never looks at the inventory table.
+    conn.execute(
+        """
+        INSERT INTO barcode_sequence (name, next_serial)
+        SELECT ?, COALESCE(MAX(CAST(SUBSTR(barcode, 13, 5) AS INTEGER)), 0) + 1
+        FROM inventory
+        WHERE LENGTH(barcode) = 17 AND barcode NOT GLOB '*[^0-9]*'
+        ON CONFLICT(name) DO UPDATE SET
+            next_serial = MAX(next_serial, excluded.next_serial)
+        """,
+        (_BARCODE_SEQUENCE_NAME,),
+    )
+
+
+def reserve_barcode_serials(count=1, conn=None):
+    """
+    Atomically reserve `count` consecutive barcode serials and return the first.
+    Reserved serials are never handed out again, even if unused.
+    """
+    count = int(count)
+    if count < 1:
+        raise ValueError("Serial count must be at least 1.")
+
+    if conn is None:
+        with open_database(write=True) as write_conn:
+            return reserve_barcode_serials(count, conn=write_conn)
+
+    cursor = conn.execute(
+        """
+        UPDATE barcode_sequence
+        SET next_serial = next_serial + ?
+        WHERE name = ? AND next_serial + ? <= ?
+        """,
+        (count, _BARCODE_SEQUENCE_NAME, count, BARCODE_SERIAL_MAX + 1),
+    )
+    if cursor.rowcount == 0:
+        raise ValueError("No barcode serials left to allocate.")
+    next_serial = conn.execute(
+        "SELECT next_serial FROM barcode_sequence WHERE name = ?",
+        (_BARCODE_SEQUENCE_NAME,),
+    ).fetchone()[0]
+    return int(next_serial) - count
+
+
+def advance_barcode_sequence(conn, barcode):
+    """
+    Keep the sequence ahead of a barcode that was stored without being
+    reserved (manual entry, imports).
+    """
+    serial = _barcode_serial(barcode)
+    if serial is None:
+        return
+    conn.execute(
+        "UPDATE barcode_sequence SET next_serial = MAX(next_serial, ?) WHERE name = ?",
+        (serial + 1, _BARCODE_SEQUENCE_NAME),
+    )
+
+
 def list_inventory_barcodes(conn=None):
     if conn is not None:
         rows = conn.execute(
@@ -603,6 +2092,16 @@ def list_inventory_barcodes(conn=None):
     return [str(row["barcode"]).strip() for row in rows if row["barcode"] is not None]
 
 
+def roll_weight_from_row(row):
+    if row is None:
+        return None
+    for key in ("roll_weight", "filament_amount", "times_logged_out"):
+        value = _to_float(row[key] if key in row.keys() else None)
+        if value is not None:
+            return value
+    return None
+
+
 def get_roll_weight(barcode: str, conn=None):
     if not barcode:
         return None
@@ -611,15 +2110,6 @@ def get_roll_weight(barcode: str, conn=None):
     if not target:
         return None
 
-    def _resolve_from_row(row):
-        if row is None:
-            return None
-        for key in ("roll_weight", "filament_amount", "times_logged_out"):
-            value = _to_float(row[key] if key in row.keys() else None)
-            if value is not None:
-                return value
-        return None
-
     if conn is not None:
         row = conn.execute(
             """
@@ -630,7 +2120,7 @@ def get_roll_weight(barcode: str, conn=None):
             """,
             (target,),
         ).fetchone()
-        return _resolve_from_row(row)
+        return roll_weight_from_row(row)
 
     with open_database(write=False) as read_conn:
         row = read_conn.execute(
@@ -642,7 +2132,7 @@ def get_roll_weight(barcode: str, conn=None):
             """,
             (target,),
         ).fetchone()
-        return _resolve_from_row(row)
+        return roll_weight_from_row(row)
 
 
 def toggle_inventory_favorite(barcode: str):
@@ -741,7 +2231,34 @@ def update_inventory_roll(
     is_empty_value = 1 if _to_bool(is_empty, False) else 0
 
     with open_database(write=True) as conn:
-        cursor = conn.execute(
+        existing = conn.execute(
+            """
+            SELECT brand, color, material, attribute_1, attribute_2, location, version_id
+            FROM inventory
+            WHERE barcode = ?
+            LIMIT 1
+            """,
+            (target,),
+        ).fetchone()
+        if existing is None:
+            return False
+
+        # Events point at roll versions, so a label change closes the current
+        # version and opens a new one; the roll's history is never rewritten.
+        labels = (
+            brand_value,
+            color_value,
+            material_value,
+            attribute_1_value,
+            attribute_2_value,
+            location_value,
+        )
+        current_labels = tuple(existing[column] for column, _ in _EVENT_DIMENSION_COLUMNS)
+        if existing["version_id"] is None or labels != current_labels:
+            open_roll_version(conn, target, labels, _normalize_timestamp(datetime.now()))
+            # Reports by current roll details relabel the roll's past usage.
+            bump_usage_history_counter(conn)
+        conn.execute(
             """
             UPDATE inventory
             SET
@@ -769,30 +2286,5 @@ def update_inventory_roll(
                 target,
             ),
         )
-        if cursor.rowcount <= 0:
-            return False
-
-        conn.execute(
-            """
-            UPDATE usage_events
-            SET
-                brand = ?,
-                color = ?,
-                material = ?,
-                attribute_1 = ?,
-                attribute_2 = ?,
-                location = ?
-            WHERE barcode = ?
-            """,
-            (
-                brand_value,
-                color_value,
-                material_value,
-                attribute_1_value,
-                attribute_2_value,
-                location_value,
-                target,
-            ),
-        )
 
     return True
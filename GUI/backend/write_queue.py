@@ -0,0 +1,150 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from backend.workbook_store import open_database
+
+MAX_GROUP_SIZE = 32
+BEGIN_RETRY_COUNT = 5
+BEGIN_RETRY_BACKOFF_SEC = 0.05
+BEGIN_BUSY_TIMEOUT_MS = 1000
+
+_WRITER_LOCK = threading.Lock()
+_WRITER = {"pid": None, "thread": None, "queue": None}
+
+
+class _WriteCommand:
+    __slots__ = ("fn", "args", "kwargs", "future")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+def _is_busy_error(exc):
+    text = str(exc).lower()
+    return "locked" in text or "busy" in text
+
+
+def _execute_group(commands):
+    outcomes = []
+    with open_database(write=True) as conn:
+        previous_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        conn.execute(f"PRAGMA busy_timeout = {BEGIN_BUSY_TIMEOUT_MS}")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(previous_timeout)}")
+
+        for command in commands:
+            # Each command runs in its own savepoint so a failing command
+            # does not discard the rest of the group.
+            conn.execute("SAVEPOINT write_queue_command")
+            try:
+                value = command.fn(*command.args, **command.kwargs)
+            except Exception as exc:
+                conn.execute("ROLLBACK TO write_queue_command")
+                conn.execute("RELEASE write_queue_command")
+                outcomes.append((False, exc))
+                continue
+            conn.execute("RELEASE write_queue_command")
+            outcomes.append((True, value))
+    return outcomes
+
+
+def _run_group(commands):
+    pending = [command for command in commands if command.future.set_running_or_notify_cancel()]
+    if not pending:
+        return
+
+    attempt = 0
+    while True:
+        try:
+            outcomes = _execute_group(pending)
+            break
+        except sqlite3.OperationalError as exc:
+            if _is_busy_error(exc) and attempt < BEGIN_RETRY_COUNT:
+                attempt += 1
+                time.sleep(BEGIN_RETRY_BACKOFF_SEC * (2 ** (attempt - 1)))
+                continue
+            for command in pending:
+                command.future.set_exception(exc)
+            return
+        except Exception as exc:
+            for command in pending:
+                command.future.set_exception(exc)
+            return
+
+    for command, (succeeded, value) in zip(pending, outcomes):
+        if succeeded:
+            command.future.set_result(value)
+        else:
+            command.future.set_exception(value)
+
+
+def _writer_loop(command_queue):
+    while True:
+        commands = [command_queue.get()]
+        # Everything queued while the previous group was committing is
+        # written in the next transaction.
+        while len(commands) < MAX_GROUP_SIZE:
+            try:
+                commands.append(command_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _run_group(commands)
+        except Exception as exc:
+            for command in commands:
+                if not command.future.done():
+                    command.future.set_exception(exc)
+
+
+def _writer_queue():
+    pid = os.getpid()
+    with _WRITER_LOCK:
+        thread = _WRITER["thread"]
+        if _WRITER["pid"] != pid or thread is None or not thread.is_alive():
+            command_queue = queue.Queue()
+            thread = threading.Thread(
+                target=_writer_loop,
+                args=(command_queue,),
+                name="filament-db-writer",
+                daemon=True,
+            )
+            _WRITER["pid"] = pid
+            _WRITER["thread"] = thread
+            _WRITER["queue"] = command_queue
+            thread.start()
+        return _WRITER["queue"]
+
+
+def is_writer_thread():
+    return threading.current_thread() is _WRITER["thread"]
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Queue a write function for the dedicated writer thread.
+    Returns a Future resolving to the function's return value (or exception).
+    """
+    if is_writer_thread():
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    command = _WriteCommand(fn, args, kwargs)
+    _writer_queue().put(command)
+    return command.future
+
+
+def run(fn, *args, **kwargs):
+    return submit(fn, *args, **kwargs).result()
@@ -1,9 +1,21 @@
 from datetime import datetime, timedelta
+import json
 import os
 from urllib.parse import urlparse
 
 from dotenv import load_dotenv
-from flask import Flask, flash, jsonify, redirect, render_template, request, url_for
+from flask import (
+    Flask,
+    Response,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+    url_for,
+)
 
 from backend import (
     app_release,
@@ -15,15 +27,24 @@ from backend import (
     settings_store,
     spreadsheet_stats,
     usage_analytics,
+    write_queue,
 )
 from backend.config import EMPTY_THRESHOLD, LOW_THRESHOLD
 from backend.workbook_store import (
+    INVENTORY_SORT_OPTIONS,
+    count_inventory_rows,
     get_inventory_roll,
     list_inventory_rows,
+    query_inventory_page,
+    search_inventory,
     toggle_inventory_favorite,
     update_inventory_roll,
 )
 
+# Popular and stock-status pages are ranked in SQL (or the column engine) and
+# read this many rows at a time; "Next" links carry a keyset cursor.
+REPORT_PAGE_SIZE = 200
+
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-change-me")
@@ -39,23 +60,6 @@ def parse_float(value, field_name):
     except ValueError as exc:
         raise ValueError(f"{field_name} must be a valid number.") from exc
 
-def parse_timestamp(value):
-    if value is None:
-        return datetime.min
-    if isinstance(value, datetime):
-        return value
-
-    text = str(value).strip()
-    if not text:
-        return datetime.min
-
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-        try:
-            return datetime.strptime(text, fmt)
-        except ValueError:
-            continue
-    return datetime.min
-
 
 def parse_date(value):
     if value is None:
@@ -137,7 +141,51 @@ def get_threshold_settings(app_settings):
 def get_scale_read_settings(app_settings):
     timeout_sec = parse_int_setting(app_settings.get("scale_timeout_sec"), 5, 1, 60)
     retry_count = parse_int_setting(app_settings.get("scale_retry_count"), 2, 1, 10)
-    return timeout_sec, retry_count
+    max_age_sec = parse_int_setting(app_settings.get("scale_max_age_ms"), 1000, 100, 60000) / 1000.0
+    return timeout_sec, retry_count, max_age_sec
+
+
+def get_scale_settle_settings(app_settings):
+    settle_window_ms = parse_int_setting(app_settings.get("scale_settle_window_ms"), 1000, 100, 5000)
+    tolerance_g = parse_float_setting(app_settings.get("scale_settle_tolerance_g"), 2.0, 0.0, 100.0)
+    return settle_window_ms / 1000.0, tolerance_g
+
+
+def get_scale_device_key(app_settings, station):
+    """
+    Scale device key mapped to a station in settings: "" (the first scale)
+    when no station is given, None when the station is not configured.
+    """
+    station = str(station or "").strip().lower()
+    if not station:
+        return ""
+    return (app_settings.get("scale_stations") or {}).get(station)
+
+
+def read_scale(app_settings, device_key=""):
+    """
+    (weight, stable) from the scale using the configured read mode. stable
+    is None in "latest" mode, which does not wait for the scale to settle.
+    """
+    timeout_sec, retry_count, max_age_sec = get_scale_read_settings(app_settings)
+    read_mode = str(app_settings.get("scale_read_mode", "stable")).strip().lower()
+    if read_mode == "latest":
+        weight = data_manipulation.read_scale_weight(
+            timeout_sec=timeout_sec,
+            retry_count=retry_count,
+            max_age_sec=max_age_sec,
+            device_key=device_key,
+        )
+        return weight, None
+    settle_window_sec, tolerance_g = get_scale_settle_settings(app_settings)
+    return data_manipulation.read_stable_scale_weight(
+        timeout_sec=timeout_sec,
+        retry_count=retry_count,
+        max_age_sec=max_age_sec,
+        settle_window_sec=settle_window_sec,
+        tolerance_g=tolerance_g,
+        device_key=device_key,
+    )
 
 
 def get_used_roll_map_settings(app_settings):
@@ -214,6 +262,15 @@ def enforce_onboarding():
     return redirect(url_for("welcome", next=next_path))
 
 
+@app.before_request
+def remember_scale_station():
+    # A bench opens a weighing page once with ?station=<name> (empty to clear
+    # it); the page passes that station on to its scale reads for the rest of
+    # the browser session. The scale API itself only reads ?station=.
+    if request.endpoint in ("log_filament", "new_roll") and "station" in request.args:
+        session["scale_station"] = request.args.get("station", "").strip()
+
+
 @app.route("/welcome", methods=["GET", "POST"])
 def welcome():
     current = settings_store.load_settings()
@@ -272,25 +329,38 @@ def welcome():
 
 @app.route("/")
 def index():
-    filaments = get_inventory_rows()
-    filaments.sort(key=lambda row: parse_timestamp(row[0] if row else None), reverse=True)
-    color_search_tokens = color_search.get_color_search_tokens_by_color()
-
-    favorite_barcodes = [
-        row[1]
-        for row in filaments
-        if row and len(row) > 12 and str(row[12]).strip().lower() == "true"
-    ]
-
     return render_template(
         "index.html",
-        filaments=filaments,
-        total=len(filaments),
-        favorite_barcodes=favorite_barcodes,
-        color_search_tokens=color_search_tokens,
+        total=count_inventory_rows(),
+        sort_options=list(INVENTORY_SORT_OPTIONS),
     )
 
 
+@app.route("/api/inventory")
+def api_inventory():
+    app_settings = settings_store.load_settings()
+    limit = parse_int_setting(
+        request.args.get("limit"), int(app_settings.get("rows_per_page", 20)), 1, 200
+    )
+    include_total = str(request.args.get("total", "")).strip().lower() in ("1", "true", "yes")
+    page = query_inventory_page(
+        limit=limit,
+        sort=request.args.get("sort", "timestamp"),
+        direction=request.args.get("direction", "desc"),
+        cursor=request.args.get("cursor"),
+        search=request.args.get("q", ""),
+        include_total=include_total,
+    )
+    return jsonify(page), 200
+
+
+@app.route("/api/inventory/search")
+def api_inventory_search():
+    limit = parse_int_setting(request.args.get("limit"), 20, 1, 200)
+    rows = search_inventory(request.args.get("q", ""), limit=limit)
+    return jsonify({"rows": rows}), 200
+
+
 @app.route("/popular")
 def popular_filaments():
     app_settings = settings_store.load_settings()
@@ -314,15 +384,23 @@ def popular_filaments():
             weeks = None if parsed <= 0 else parsed
 
     selected_weeks = "all" if weeks is None else str(weeks)
+    cursor = request.args.get("cursor")
     if group_by == "rolls":
-        popular = spreadsheet_stats.get_most_popular_filaments(top_n=200, weeks=weeks)
+        page = spreadsheet_stats.get_popular_filaments_page(
+            limit=REPORT_PAGE_SIZE, weeks=weeks, cursor=cursor
+        )
+        popular = page["rows"]
         grouped = []
     else:
-        grouped = spreadsheet_stats.get_most_popular_groups(
-            top_n=200,
+        page = spreadsheet_stats.get_popular_groups_page(
+            limit=REPORT_PAGE_SIZE,
             weeks=weeks,
             group_by=group_by,
+            attribution=app_settings.get("analytics_attribution"),
+            engine=app_settings.get("analytics_engine"),
+            cursor=cursor,
         )
+        grouped = page["rows"]
         popular = []
 
     return render_template(
@@ -331,6 +409,8 @@ def popular_filaments():
         grouped=grouped,
         selected_weeks=selected_weeks,
         group_by=group_by,
+        next_cursor=page["next_cursor"],
+        is_first_page=not cursor,
     )
 
 
@@ -410,7 +490,12 @@ def resolve_usage_stats_request(args, app_settings, emit_flash=True):
             range_label = f"Last {weeks} week{'s' if weeks != 1 else ''}"
             start_ts = (datetime.now() - timedelta(weeks=weeks)).strftime("%Y-%m-%d %H:%M:%S")
 
-    stats = usage_analytics.get_usage_summary(start_ts=start_ts, end_ts=end_ts)
+    stats = usage_analytics.get_usage_summary(
+        start_ts=start_ts,
+        end_ts=end_ts,
+        attribution=app_settings.get("analytics_attribution"),
+        engine=app_settings.get("analytics_engine"),
+    )
     return {
         "stats": stats,
         "selected_weeks": selected_weeks,
@@ -451,8 +536,14 @@ def stock_status():
     app_settings = settings_store.load_settings()
     low_threshold, empty_threshold = get_threshold_settings(app_settings)
 
+    cursor = request.args.get("cursor")
+    next_cursor = None
     if view == "empty":
-        rows = spreadsheet_stats.get_empty_rolls(empty_threshold=empty_threshold)
+        page = spreadsheet_stats.get_empty_rolls_page(
+            empty_threshold=empty_threshold, limit=REPORT_PAGE_SIZE, cursor=cursor
+        )
+        rows = page["rows"]
+        next_cursor = page["next_cursor"]
     else:
         rows = spreadsheet_stats.get_low_or_empty_filaments(
             low_threshold=low_threshold,
@@ -463,6 +554,8 @@ def stock_status():
         "stock_status.html",
         view=view,
         rows=rows,
+        next_cursor=next_cursor,
+        is_first_page=not cursor or view != "empty",
         low_threshold=low_threshold,
         empty_threshold=empty_threshold,
     )
@@ -510,7 +603,8 @@ def log_filament():
             flash("Weight is below the recorded roll weight.", "error")
             return render_template("log.html", form_data=form_data)
 
-        updated = log_data.log_filament_data_web(
+        updated = write_queue.run(
+            log_data.log_filament_data_web,
             barcode=barcode,
             filament_amount=filament_amount,
             roll_weight=roll_weight_val,
@@ -533,14 +627,90 @@ def log_filament():
     return render_template("log.html", form_data=form_data)
 
 
+@app.route("/api/log_batch", methods=["POST"])
+def api_log_batch():
+    payload = request.get_json(silent=True)
+    source = "api_batch"
+    if isinstance(payload, dict):
+        source = str(payload.get("source") or source).strip()[:64] or "api_batch"
+        entries = payload.get("entries")
+    else:
+        entries = payload
+
+    if not isinstance(entries, list):
+        return jsonify({"error": "Expected a JSON list of {barcode, weight, timestamp?} entries."}), 400
+    if len(entries) > log_data.MAX_BATCH_ENTRIES:
+        return (
+            jsonify({"error": f"At most {log_data.MAX_BATCH_ENTRIES} entries can be logged per request."}),
+            413,
+        )
+
+    app_settings = settings_store.load_settings()
+    low_threshold, empty_threshold = get_threshold_settings(app_settings)
+    results = write_queue.run(
+        log_data.log_filament_batch_web,
+        entries,
+        source=source,
+        empty_threshold=empty_threshold,
+    )
+
+    low_stock_alerts = app_settings.get("low_stock_alerts", True)
+    for result in results:
+        if result["status"] == "logged":
+            result["low_stock"] = bool(low_stock_alerts and result["filament_amount"] < low_threshold)
+
+    logged = sum(1 for result in results if result["status"] == "logged")
+    return jsonify({"logged": logged, "failed": len(results) - logged, "results": results}), 200
+
+
 @app.route("/api/scale_weight")
 def api_scale_weight():
     app_settings = settings_store.load_settings()
-    timeout_sec, retry_count = get_scale_read_settings(app_settings)
-    weight = data_manipulation.read_scale_weight(timeout_sec=timeout_sec, retry_count=retry_count)
+    station = request.args.get("station", "").strip()
+    device_key = get_scale_device_key(app_settings, station)
+    if device_key is None:
+        return jsonify({"error": f"Unknown scale station: {station}"}), 404
+    weight, stable = read_scale(app_settings, device_key)
     if weight is None:
         return jsonify({"error": "Scale unavailable"}), 503
-    return jsonify({"weight": round(float(weight), 2)})
+    payload = {"weight": round(float(weight), 2)}
+    if stable is not None:
+        payload["stable"] = stable
+    return jsonify(payload)
+
+
+@app.route("/api/scale_weight/stream")
+def api_scale_weight_stream():
+    app_settings = settings_store.load_settings()
+    station = request.args.get("station", "").strip()
+    device_key = get_scale_device_key(app_settings, station)
+    if device_key is None:
+        return jsonify({"error": f"Unknown scale station: {station}"}), 404
+    _, _, max_age_sec = get_scale_read_settings(app_settings)
+    settle_window_sec, tolerance_g = get_scale_settle_settings(app_settings)
+
+    def events():
+        # Every open page shares the one background reader; a comment line
+        # keeps idle connections (and proxies) from timing out.
+        yield "retry: 3000\n\n"
+        for reading in data_manipulation.scale_reader().stream_readings(
+            settle_window_sec=settle_window_sec,
+            tolerance_g=tolerance_g,
+            max_age_sec=max_age_sec,
+            device_key=device_key,
+        ):
+            if reading is None:
+                yield ": keep-alive\n\n"
+                continue
+            if reading["weight"] is not None:
+                reading["weight"] = round(float(reading["weight"]), 2)
+            yield f"event: weight\ndata: {json.dumps(reading)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/update/check")
@@ -554,7 +724,6 @@ def api_update_check():
 def new_roll():
     app_settings = settings_store.load_settings()
     _, empty_threshold = get_threshold_settings(app_settings)
-    scale_timeout_sec, scale_retry_count = get_scale_read_settings(app_settings)
     map_fallback_level, map_min_samples = get_used_roll_map_settings(app_settings)
     negative_filament_policy = str(app_settings.get("negative_filament_policy", "block")).strip().lower()
     if negative_filament_policy not in settings_store.NEGATIVE_FILAMENT_POLICY_OPTIONS:
@@ -585,7 +754,8 @@ def new_roll():
             )
 
         try:
-            barcode = generate_barcode.generate_filament_barcode(
+            barcode = write_queue.run(
+                generate_barcode.generate_filament_barcode,
                 brand=brand,
                 color=color,
                 material=material,
@@ -640,10 +810,15 @@ def new_roll():
                 roll_state=roll_state,
             )
 
-        scale_weight = data_manipulation.read_scale_weight(
-            timeout_sec=scale_timeout_sec,
-            retry_count=scale_retry_count,
-        )
+        station = session.get("scale_station", "")
+        scale_device_key = get_scale_device_key(app_settings, station)
+        if scale_device_key is None:
+            flash(f"Unknown scale station: {station}", "error")
+            scale_weight, scale_stable = None, None
+        else:
+            scale_weight, scale_stable = read_scale(app_settings, scale_device_key)
+        if scale_weight is not None and scale_stable is False:
+            flash("The scale had not settled; check the weight before saving.", "info")
         return render_new_roll(
             step="weight",
             barcode=barcode,
@@ -798,7 +973,8 @@ def new_roll():
             )
 
         try:
-            created = log_data.add_new_roll_web(
+            created = write_queue.run(
+                log_data.add_new_roll_web,
                 brand=brand,
                 color=color,
                 material=material,
@@ -962,7 +1138,8 @@ def edit_roll(barcode):
             )
 
         is_empty = filament_amount <= empty_threshold
-        updated = update_inventory_roll(
+        updated = write_queue.run(
+            update_inventory_roll,
             barcode=target_barcode,
             brand=form_data["brand"],
             color=form_data["color"],
@@ -1011,7 +1188,7 @@ def toggle_favorite():
     if not barcode:
         return jsonify({"error": "Missing barcode"}), 400
 
-    is_favorite = toggle_inventory_favorite(barcode)
+    is_favorite = write_queue.run(toggle_inventory_favorite, barcode)
     if is_favorite is None:
         return jsonify({"error": "Barcode not found"}), 404
 
@@ -1144,12 +1321,36 @@ def settings():
             "scale_retry_count": request.form.get(
                 "scale_retry_count", current.get("scale_retry_count", 2)
             ),
+            "scale_max_age_ms": request.form.get(
+                "scale_max_age_ms", current.get("scale_max_age_ms", 1000)
+            ),
+            "scale_read_mode": request.form.get(
+                "scale_read_mode", current.get("scale_read_mode", "stable")
+            ),
+            "scale_settle_window_ms": request.form.get(
+                "scale_settle_window_ms", current.get("scale_settle_window_ms", 1000)
+            ),
+            "scale_settle_tolerance_g": request.form.get(
+                "scale_settle_tolerance_g", current.get("scale_settle_tolerance_g", 2.0)
+            ),
+            "scale_stations": request.form.get(
+                "scale_stations", current.get("scale_stations", {})
+            ),
             "negative_filament_policy": request.form.get(
                 "negative_filament_policy", current.get("negative_filament_policy", "block")
             ),
             "backup_retention_days": request.form.get(
                 "backup_retention_days", current.get("backup_retention_days", 30)
             ),
+            "storage_profile": request.form.get(
+                "storage_profile", current.get("storage_profile", "balanced")
+            ),
+            "analytics_attribution": request.form.get(
+                "analytics_attribution", current.get("analytics_attribution", "current")
+            ),
+            "analytics_engine": request.form.get(
+                "analytics_engine", current.get("analytics_engine", "sql")
+            ),
             "low_stock_alerts": request.form.get("low_stock_alerts") == "on",
             "auto_read_scale_on_weight_step": request.form.get("auto_read_scale_on_weight_step")
             == "on",
@@ -1167,6 +1368,11 @@ def settings():
         roll_condition_options=settings_store.ROLL_CONDITION_OPTIONS,
         used_roll_map_level_options=settings_store.USED_ROLL_MAP_LEVEL_OPTIONS,
         negative_filament_policy_options=settings_store.NEGATIVE_FILAMENT_POLICY_OPTIONS,
+        storage_profile_options=settings_store.STORAGE_PROFILE_OPTIONS,
+        analytics_attribution_options=settings_store.ANALYTICS_ATTRIBUTION_OPTIONS,
+        analytics_engine_options=settings_store.ANALYTICS_ENGINE_OPTIONS,
+        scale_read_mode_options=settings_store.SCALE_READ_MODE_OPTIONS,
+        scale_devices=data_manipulation.list_scale_devices(),
     )
 
 
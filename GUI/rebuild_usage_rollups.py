@@ -0,0 +1,45 @@
+import argparse
+import os
+import sys
+
+from backend import workbook_store
+from backend.config import DATABASE_PATH
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the daily usage rollup table from the usage event history."
+    )
+    parser.add_argument(
+        "--db",
+        default=DATABASE_PATH,
+        help=f"Path to SQLite database (default: {DATABASE_PATH})",
+    )
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}", file=sys.stderr)
+        return 1
+
+    workbook_store.DATABASE_PATH = args.db
+    try:
+        day_rows = workbook_store.rebuild_usage_rollups()
+    except Exception as exc:
+        print(f"Rebuild failed: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        workbook_store.close_database_connections()
+
+    print("Rebuild complete.")
+    print(f"DB:   {args.db}")
+    print(f"Daily rollup rows: {day_rows}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
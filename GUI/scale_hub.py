@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+
+from backend import data_manipulation, scale_service
+from backend.config import DEFAULT_SCALE_HUB_SOCKET, SCALE_HUB_SOCKET
+
+
+def _number(message, name, default):
+    try:
+        return float(message.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _device_key(message):
+    return str(message.get("device") or "")
+
+
+def handle_request(message):
+    """
+    Reply for one non-stream request line from an app worker.
+    """
+    op = message.get("op")
+    if op == "devices":
+        return {"devices": scale_service.list_devices()}
+    if op == "weight":
+        weight = scale_service.get_weight(
+            max_age_sec=_number(message, "max_age_sec", 1.0),
+            wait_sec=_number(message, "wait_sec", 5.0),
+            device_key=_device_key(message),
+        )
+        return {"weight": weight}
+    if op == "stable":
+        weight, stable = scale_service.get_stable_weight(
+            settle_window_sec=_number(message, "settle_window_sec", 1.0),
+            tolerance_g=_number(message, "tolerance_g", 2.0),
+            max_age_sec=_number(message, "max_age_sec", 1.0),
+            wait_sec=_number(message, "wait_sec", 5.0),
+            device_key=_device_key(message),
+        )
+        return {"weight": weight, "stable": stable}
+    if op == "latest":
+        return scale_service.latest_reading(_device_key(message))
+    return {"error": f"Unknown op: {op}"}
+
+
+class ScaleHubHandler(socketserver.StreamRequestHandler):
+    def _reply(self, payload):
+        self.wfile.write(json.dumps(payload).encode("utf-8") + b"\n")
+
+    def _stream(self, message):
+        readings = scale_service.stream_readings(
+            settle_window_sec=_number(message, "settle_window_sec", 1.0),
+            tolerance_g=_number(message, "tolerance_g", 2.0),
+            max_age_sec=_number(message, "max_age_sec", 1.0),
+            keepalive_sec=_number(message, "keepalive_sec", scale_service.STREAM_KEEPALIVE_SEC),
+            device_key=_device_key(message),
+        )
+        try:
+            for reading in readings:
+                self._reply({"keepalive": True} if reading is None else reading)
+        finally:
+            readings.close()
+
+    def handle(self):
+        # One JSON request per line; a connection may send several, and a
+        # "stream" request keeps it for pushed readings until it closes.
+        try:
+            for line in self.rfile:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    self._reply({"error": "Invalid request"})
+                    continue
+                if not isinstance(message, dict):
+                    self._reply({"error": "Invalid request"})
+                    continue
+                if message.get("op") == "stream":
+                    self._stream(message)
+                    return
+                self._reply(handle_request(message))
+        except OSError:
+            # The worker went away mid-reply.
+            pass
+
+
+class ScaleHubServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _socket_in_use(path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def build_parser():
+    default_socket = SCALE_HUB_SOCKET or DEFAULT_SCALE_HUB_SOCKET
+    parser = argparse.ArgumentParser(
+        description=(
+            "Own the USB scale and serve its readings to every app worker over a local Unix socket. "
+            "Start the app with SCALE_HUB_SOCKET set to the same path."
+        )
+    )
+    parser.add_argument(
+        "--socket",
+        default=default_socket,
+        help=f"Unix socket path to listen on (default: {default_socket})",
+    )
+    parser.add_argument(
+        "--idle-stop-sec",
+        type=float,
+        default=0.0,
+        help=(
+            "Close the scale after this many seconds without readers, reopening it on the next "
+            "request (default: 0, keep it open)."
+        ),
+    )
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("The scale hub needs Unix socket support, which this platform lacks.", file=sys.stderr)
+        return 2
+    if data_manipulation.hid is None:
+        print("The hidapi package is not installed; install it to read the scale.", file=sys.stderr)
+        return 1
+
+    if os.path.exists(args.socket):
+        if _socket_in_use(args.socket):
+            print(f"A scale hub is already listening on {args.socket}", file=sys.stderr)
+            return 1
+        # Left behind by a hub that did not shut down cleanly.
+        os.remove(args.socket)
+
+    scale_service.IDLE_STOP_SEC = args.idle_stop_sec if args.idle_stop_sec > 0 else float("inf")
+    # One reader per connected scale; a scale plugged in later gets its
+    # reader on the first request for it.
+    for device in scale_service.list_devices():
+        scale_service.start(device["key"])
+        print(f"Found scale {device['key']}")
+
+    server = ScaleHubServer(args.socket, ScaleHubHandler)
+    print(f"Scale hub listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.remove(args.socket)
+        except OSError:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
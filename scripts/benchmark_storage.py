@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_DIR = os.path.join(ROOT_DIR, "GUI")
+if GUI_DIR not in sys.path:
+    sys.path.insert(0, GUI_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="filament_bench_")
+SETTINGS_FILE = os.path.join(WORK_DIR, "settings.json")
+
+# backend.config reads these at import time, so point them at scratch files first.
+os.environ["SETTINGS_PATH"] = SETTINGS_FILE
+os.environ["EXCEL_PATH"] = os.path.join(WORK_DIR, "missing.xlsx")
+
+from backend import log_data, settings_store, workbook_store  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed_inventory(roll_count):
+    barcodes = []
+    for index in range(roll_count):
+        barcode = f"0100101000000{index + 1:04d}"
+        log_data.add_new_roll_web(
+            brand="Bambu Lab",
+            color="Black",
+            material="PLA",
+            attr1="",
+            attr2="",
+            location="Lab",
+            starting_weight=1250,
+            filament_amount_target=1000,
+            barcode=barcode,
+            source="benchmark",
+        )
+        barcodes.append(barcode)
+    return barcodes
+
+
+def run_profile(profile_name, args):
+    settings_store.save_settings({"storage_profile": profile_name, "onboarding_completed": True})
+    workbook_store.DATABASE_PATH = os.path.join(WORK_DIR, f"{profile_name}.db")
+    barcodes = seed_inventory(args.rolls)
+
+    stop_at = time.perf_counter() + args.seconds
+    write_latencies = []
+    read_latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def writer(worker_index):
+        amount = 1000.0
+        step = 0
+        while time.perf_counter() < stop_at:
+            barcode = barcodes[(worker_index + step) % len(barcodes)]
+            amount = max(amount - 0.5, 10.0)
+            started = time.perf_counter()
+            try:
+                log_data.log_filament_data_web(barcode, amount, source="benchmark")
+            except Exception as exc:
+                with lock:
+                    errors.append(str(exc))
+                continue
+            with lock:
+                write_latencies.append(time.perf_counter() - started)
+            step += 1
+
+    def reader():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                workbook_store.list_inventory_rows()
+            except Exception as exc:
+                with lock:
+                    errors.append(str(exc))
+                continue
+            with lock:
+                read_latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(args.writers)]
+    threads.extend(threading.Thread(target=reader) for _ in range(args.readers))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    workbook_store.close_database_connections()
+    return {
+        "profile": profile_name,
+        "writes_per_sec": round(len(write_latencies) / args.seconds, 1),
+        "reads_per_sec": round(len(read_latencies) / args.seconds, 1),
+        "write_p95_ms": round(percentile(write_latencies, 0.95) * 1000.0, 2),
+        "read_p95_ms": round(percentile(read_latencies, 0.95) * 1000.0, 2),
+        "read_max_ms": round(max(read_latencies, default=0.0) * 1000.0, 2),
+        "errors": len(errors),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure concurrent read/write throughput of the SQLite store "
+            "for each storage performance profile."
+        )
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(settings_store.STORAGE_PROFILE_OPTIONS),
+        choices=list(settings_store.STORAGE_PROFILE_OPTIONS),
+        help="Profiles to benchmark (default: all).",
+    )
+    parser.add_argument("--rolls", type=int, default=500, help="Rolls to seed per database (default: 500).")
+    parser.add_argument("--writers", type=int, default=2, help="Concurrent writer threads (default: 2).")
+    parser.add_argument("--readers", type=int, default=4, help="Concurrent reader threads (default: 4).")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration per profile (default: 5).")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = [run_profile(profile_name, args) for profile_name in args.profiles]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    header = (
+        f"{'profile':<10} {'writes/s':>9} {'reads/s':>9} "
+        f"{'write p95':>10} {'read p95':>9} {'read max':>9} {'errors':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(
+            f"{row['profile']:<10} {row['writes_per_sec']:>9} {row['reads_per_sec']:>9} "
+            f"{row['write_p95_ms']:>8}ms {row['read_p95_ms']:>7}ms {row['read_max_ms']:>7}ms "
+            f"{row['errors']:>7}"
+        )
+    print(f"\nScratch databases: {WORK_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,158 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_DIR = os.path.join(ROOT_DIR, "GUI")
+if GUI_DIR not in sys.path:
+    sys.path.insert(0, GUI_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="filament_plans_")
+
+# backend.config reads these at import time, so point them at scratch files first.
+os.environ["SETTINGS_PATH"] = os.path.join(WORK_DIR, "settings.json")
+os.environ["EXCEL_PATH"] = os.path.join(WORK_DIR, "missing.xlsx")
+
+from backend import spreadsheet_stats, usage_cube, workbook_store  # noqa: E402
+
+WINDOW_START = "2024-01-01 00:00:00"
+WINDOW_END = "2024-03-31 23:59:59"
+CHECKED_TABLES = ("usage_event_log", "inventory", "usage_daily")
+
+
+def analytics_queries():
+    queries = []
+    window_start_epoch = workbook_store.timestamp_epoch(WINDOW_START)
+    popular = spreadsheet_stats.build_popular_filaments_queries(window_start_epoch, 200)
+    for name in ("ranked", "window_events", "fallback"):
+        queries.append((f"popular rolls ({name})", popular[name]))
+
+    for label, start_ts, end_ts, before_ts in (
+        ("start", WINDOW_START, None, None),
+        ("end", None, WINDOW_END, None),
+        ("range", WINDOW_START, WINDOW_END, None),
+        ("edge day", WINDOW_START, None, "2024-01-02"),
+    ):
+        queries.append(
+            (
+                f"usage cube events ({label})",
+                usage_cube.build_cube_events_query(start_ts, end_ts, before_ts, rollup_days_only=True),
+            )
+        )
+    for label, first_day, last_day in (
+        ("range", WINDOW_START[:10], WINDOW_END[:10]),
+        ("start", WINDOW_START[:10], None),
+        ("end", None, WINDOW_END[:10]),
+    ):
+        queries.append(
+            (f"usage cube rollup ({label})", usage_cube.build_cube_rollup_query(first_day, last_day))
+        )
+    return queries
+
+
+def inventory_page_queries():
+    queries = []
+    for sort_key in workbook_store.INVENTORY_SORT_OPTIONS:
+        for descending in (False, True):
+            direction = "desc" if descending else "asc"
+            for label, position in (("first page", None), ("next page", (0, ""))):
+                queries.append(
+                    (
+                        f"inventory page by {sort_key} {direction} ({label})",
+                        workbook_store.build_inventory_page_query(sort_key, descending, 21, position),
+                    )
+                )
+    return queries
+
+
+def plan_problems(plan_details):
+    problems = []
+    for detail in plan_details:
+        words = detail.split()
+        if len(words) < 2 or words[0] != "SCAN":
+            continue
+        if words[1] in CHECKED_TABLES:
+            problems.append(detail)
+    return problems
+
+
+def page_plan_problems(plan_details):
+    # A page may walk its sort index in order (the LIMIT stops it early), but
+    # must not scan the table or sort it into a temp b-tree.
+    problems = []
+    for detail in plan_details:
+        words = detail.split()
+        if detail.startswith("USE TEMP B-TREE"):
+            problems.append(detail)
+        elif len(words) >= 2 and words[0] == "SCAN" and words[1] in CHECKED_TABLES and "INDEX" not in words:
+            problems.append(detail)
+    return problems
+
+
+def check_plans(conn, verbose=False):
+    failures = 0
+    checks = [(query, plan_problems) for query in analytics_queries()]
+    checks.extend((query, page_plan_problems) for query in inventory_page_queries())
+    for (label, (sql, params)), find_problems in checks:
+        plan_details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        problems = find_problems(plan_details)
+        status = "FAIL" if problems else "ok"
+        print(f"{status:<5} {label}")
+        if problems or verbose:
+            for detail in plan_details:
+                print(f"      {detail}")
+        if problems:
+            failures += 1
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Check that the analytics queries search the usage event log and inventory "
+            "through an index instead of scanning the tables, and that every inventory "
+            "page sort reads its index in order instead of sorting the table."
+        )
+    )
+    parser.add_argument(
+        "--database",
+        default="",
+        help=(
+            "Check plans against an existing database file, migrating it to the current "
+            "schema first (default: fresh scratch schema)."
+        ),
+    )
+    parser.add_argument("--verbose", action="store_true", help="Print every plan, not only failures.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    database_path = args.database or os.path.join(WORK_DIR, "plans.db")
+    if args.database and not os.path.exists(database_path):
+        print(f"Database not found: {database_path}", file=sys.stderr)
+        return 2
+
+    workbook_store.DATABASE_PATH = database_path
+    with workbook_store.open_database(write=False):
+        # Opening through the store applies any pending schema migration.
+        pass
+    workbook_store.close_database_connections()
+
+    conn = sqlite3.connect(database_path)
+    try:
+        failures = check_plans(conn, verbose=args.verbose)
+    finally:
+        conn.close()
+
+    if failures:
+        print(f"\n{failures} query plan(s) scan a table.")
+        return 1
+    print("\nAll analytics queries use an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_DIR = os.path.join(ROOT_DIR, "GUI")
+if GUI_DIR not in sys.path:
+    sys.path.insert(0, GUI_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="filament_tests_")
+
+# backend.config reads these at import time, so point them at scratch files first.
+os.environ["DATABASE_PATH"] = os.path.join(WORK_DIR, "inventory.db")
+os.environ["SETTINGS_PATH"] = os.path.join(WORK_DIR, "settings.json")
+os.environ["EXCEL_PATH"] = os.path.join(WORK_DIR, "missing.xlsx")
+
+from backend import log_data, workbook_store  # noqa: E402
+
+
+def _events(barcode):
+    with workbook_store.open_database() as conn:
+        return [
+            (row["timestamp"], row["filament_amount"], row["delta_used"])
+            for row in conn.execute(
+                """
+                SELECT timestamp, filament_amount, delta_used
+                FROM usage_event_log
+                WHERE barcode = ? AND event_type = 'log_usage'
+                ORDER BY ts_epoch, id
+                """,
+                (barcode,),
+            )
+        ]
+
+
+class LogBatchOrderTest(unittest.TestCase):
+    def setUp(self):
+        roll = log_data.add_new_roll_web("Polymaker", "Black", "PLA", "", "", "Lab", 1250, 1000)
+        self.barcode = roll["barcode"]
+        # The roll (1000 g of filament on a 250 g spool) was added ten days ago.
+        added = (datetime.now() - timedelta(days=10)).strftime("%Y-%m-%d %H:%M:%S")
+        with workbook_store.open_database(write=True) as conn:
+            for table in ("inventory", "usage_event_log"):
+                conn.execute(
+                    f"UPDATE {table} SET timestamp = ?, ts_epoch = ? WHERE barcode = ?",
+                    (added, workbook_store.timestamp_epoch(added), self.barcode),
+                )
+
+    def test_out_of_order_entries_apply_oldest_first(self):
+        now = datetime.now().replace(microsecond=0)
+        earlier = (now - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+        results = log_data.log_filament_batch_web(
+            [
+                {"barcode": self.barcode, "weight": 900},
+                {"barcode": self.barcode, "weight": 1000, "timestamp": earlier},
+            ]
+        )
+
+        # Results stay in input order, deltas follow time order.
+        self.assertEqual([result["index"] for result in results], [0, 1])
+        self.assertEqual(results[0]["filament_amount"], 650.0)
+        self.assertEqual(results[0]["delta_used"], 100.0)
+        self.assertEqual(results[1]["filament_amount"], 750.0)
+        self.assertEqual(results[1]["delta_used"], 250.0)
+
+        roll = workbook_store.get_inventory_roll(self.barcode)
+        self.assertEqual(roll["filament_amount"], 650.0)
+        self.assertEqual(roll["times_logged_out"], 2)
+        self.assertGreaterEqual(roll["timestamp"], now.strftime("%Y-%m-%d %H:%M:%S"))
+        self.assertEqual([event[1:] for event in _events(self.barcode)], [(750.0, 250.0), (650.0, 100.0)])
+
+    def test_entries_older_than_last_reading_keep_the_roll_state(self):
+        log_data.log_filament_batch_web([{"barcode": self.barcode, "weight": 900}])
+        before = workbook_store.get_inventory_roll(self.barcode)
+
+        between = (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d %H:%M:%S")
+        results = log_data.log_filament_batch_web(
+            [{"barcode": self.barcode, "weight": 1150, "timestamp": between}]
+        )
+
+        # Measured against the reading logged before it, not the roll's latest.
+        self.assertEqual(results[0]["status"], "logged")
+        self.assertEqual(results[0]["delta_used"], 100.0)
+        roll = workbook_store.get_inventory_roll(self.barcode)
+        self.assertEqual(roll["filament_amount"], before["filament_amount"])
+        self.assertEqual(roll["timestamp"], before["timestamp"])
+        self.assertEqual(roll["times_logged_out"], before["times_logged_out"] + 1)
+
+    def test_future_entries_are_rejected(self):
+        results = log_data.log_filament_batch_web(
+            [{"barcode": self.barcode, "weight": 900, "timestamp": "2999-01-01 00:00:00"}]
+        )
+
+        self.assertEqual(results[0]["status"], "error")
+        self.assertEqual(workbook_store.get_inventory_roll(self.barcode)["filament_amount"], 1000.0)
+
+
+if __name__ == "__main__":
+    unittest.main()